@@ -1,8 +1,10 @@
 import subprocess
 import os
+import uuid
 import re
 import xml.etree.ElementTree as ET
 from typing import Dict, Any, List
+from .test_validator import validate_test_code
 
 class TestExecutor:
     def __init__(self):
@@ -89,9 +91,30 @@ class TestExecutor:
                 "failures": []
             }
 
+        # A file that can't even be collected fails here in milliseconds instead
+        # of after a pytest subprocess
+        with open(test_file_path, "r") as f:
+            validation = validate_test_code(f.read(), path=test_file_path)
+        if not validation["valid"]:
+            problems = "\n".join(validation["errors"])
+            print(f"Test file failed validation, not running pytest:\n{problems}")
+            return {
+                "status": "error",
+                "message": "Test file failed validation",
+                "summary": {"passed": 0, "failed": 0, "error": 1, "total": 0},
+                "reward": -10.0,
+                "logs": f"Validation failed before running pytest:\n{problems}",
+                "test_file": test_file_path,
+                "failures": [
+                    {"nodeid": os.path.basename(test_file_path), "file": test_file_path, "line": None,
+                     "message": error, "longrepr": error}
+                    for error in validation["errors"]
+                ]
+            }
+
         try:
-            # Define XML report path
-            report_path = os.path.join(self.results_dir, "report.xml")
+            # One report per run, so concurrent runs (and worker processes) never share a file
+            report_path = os.path.join(self.results_dir, f"report-{uuid.uuid4().hex}.xml")
             
             print(f"Running pytest command on {test_file_path}...")
             # Run pytest with XML reporting
@@ -123,6 +146,7 @@ class TestExecutor:
                 "reward": reward,
                 "logs": logs, # SEND RAW LOGS TO FRONTEND
                 "test_file": test_file_path,
+                "report_path": report_path,
                 "failures": failures
             }
 
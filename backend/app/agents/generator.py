@@ -1,17 +1,36 @@
 import os
 import re
+import json
+import hashlib
 import google.generativeai as genai
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Tuple, Optional, Callable
 from dotenv import load_dotenv
-from .llm_client import GeminiClient
+from .llm_client import get_gemini_client
+from .suite_merger import merge_test_modules, split_suite, SHARED_FIXTURES
+from .test_validator import validate_or_repair, validate_test_code, plugin_fixtures
+from .prompt_budget import endpoint_table
+from .test_templates import TEMPLATE_POLICY, use_template, render_test_module
 
 load_dotenv()
 
+# Endpoints per LLM call; small enough that responses don't get truncated
+GENERATION_BATCH_SIZE = int(os.getenv("GENERATION_BATCH_SIZE", "15"))
+# LLM calls in flight at once for one suite
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "4"))
+# Format of the test_<project>.manifest.json written next to each suite
+MANIFEST_VERSION = 1
+
 class TestGenerator:
-    def __init__(self, test_output_dir: str = "tests/generated"):
+    def __init__(self, test_output_dir: str = "tests/generated",
+                 batch_size: int = GENERATION_BATCH_SIZE, concurrency: int = GENERATION_CONCURRENCY,
+                 template_policy: str = TEMPLATE_POLICY):
         self.test_output_dir = test_output_dir
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.template_policy = template_policy
         os.makedirs(self.test_output_dir, exist_ok=True)
-        self.client = GeminiClient()
+        self.client = get_gemini_client()
 
     def _clean_code(self, text: str) -> str:
         """
@@ -33,56 +52,230 @@ class TestGenerator:
         
         return text
 
-    def generate_test_suite(self, project_name: str, endpoints: List[Dict[str, Any]], base_url: str = "http://localhost:5000") -> str:
-        print(f"Generating tests for {project_name}...")
+    @staticmethod
+    def _resource_key(path: str) -> str:
+        """'/api/v1/users/:id/orders' -> 'users': the first segment that names a resource."""
+        for segment in (path or "").strip("/").split("/"):
+            if not segment or segment[0] in ":{<*" or segment.lower() == "api" or re.fullmatch(r"v\d+", segment):
+                continue
+            return segment
+        return "/"
 
-        endpoints_context = ""
-        for i, ep in enumerate(endpoints):
-            endpoints_context += f"""
-            Endpoint {i+1}: {ep.get('method')} {ep.get('path')}
-            Payload: {ep.get('payload_schema')}
-            """
-
-        prompt = f"""
-        Write a pytest script for these API endpoints. 
-        Base URL: {base_url}
-        Endpoints: {endpoints_context}
-
-        REQUIREMENTS:
-        1. Use 'import pytest' and 'import requests'.
-        2. Define a fixture 'base_url'.
-        3. Write test functions starting with 'test_'.
-        4. CRITICAL: When asserting status code, ALWAYS print the response text if it fails.
-           Example: assert response.status_code == 200, f"Expected 200 but got {{response.status_code}}. Response: {{response.text}}"
-        5. Return ONLY raw python code.
+    def _group_key(self, ep: Dict[str, Any]) -> str:
+        if ep.get("source_path"):
+            return ep["source_path"]
+        if ep.get("source_file"):
+            return os.path.basename(ep["source_file"])
+        return "/" + self._resource_key(ep.get("path", "")).lstrip("/")
+
+    def _batch_endpoints(self, endpoints: List[Dict[str, Any]]) -> List[Tuple[str, List[Dict[str, Any]], bool]]:
+        """
+        Groups endpoints by source file (or resource prefix when the scanner didn't
+        record one) and splits groups into batches of at most GENERATION_BATCH_SIZE,
+        so related routes are generated together. Endpoints the template policy
+        routes away from the LLM form one "<group> (templates)" batch per group.
+        Returns (label, endpoints, templated) triples. Labels only depend on the
+        group, so they identify the same section of the suite from one generation
+        to the next.
         """
+        groups: Dict[Tuple[str, bool], List[Dict[str, Any]]] = {}
+        for ep in endpoints:
+            templated = use_template(ep, self.template_policy)
+            groups.setdefault((self._group_key(ep), templated), []).append(ep)
+
+        batches = []
+        for key, templated in sorted(groups):
+            group = groups[(key, templated)]
+            if templated:
+                # Templates cost nothing to render, so there is no reason to split them
+                batches.append((f"{key} (templates)", group, True))
+                continue
+            chunks = [group[i:i + self.batch_size] for i in range(0, len(group), self.batch_size)]
+            for n, chunk in enumerate(chunks, start=1):
+                batches.append((key if len(chunks) == 1 else f"{key} [{n}/{len(chunks)}]", chunk, False))
+        return batches
+
+    @staticmethod
+    def _fingerprint(ep: Dict[str, Any]) -> str:
+        """Changes whenever anything the generated tests depend on changes."""
+        data = [ep.get("method"), ep.get("path"), ep.get("payload_schema"), ep.get("source_hash")]
+        return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _manifest_path(file_path: str) -> str:
+        return os.path.splitext(file_path)[0] + ".manifest.json"
 
+    def _load_previous(self, file_path: str, base_url: str) -> Optional[Tuple[str, Dict[str, str], Dict[str, Any]]]:
+        """
+        (header, section bodies, manifest sections) of the existing suite, or None
+        when it can't be updated incrementally: no suite or manifest, a different
+        base URL, or sections that went missing from the file (e.g. hand edits).
+        """
+        manifest_path = self._manifest_path(file_path)
+        if not os.path.exists(file_path) or not os.path.exists(manifest_path):
+            return None
         try:
-            print(f"Sending prompt to LLM (length: {len(prompt)} chars)...")
-            response_text = self.client.generate_content(prompt)
-            print("Received response from LLM.")
-            
-            generated_code = self._clean_code(response_text)
-            print(f"Cleaned code (length: {len(generated_code)} chars).")
-            
-            # Sanity Check: Ensure it looks like Python
-            if "def test_" not in generated_code:
-                print("WARNING: Generated code does not contain 'def test_'")
-                generated_code += "\n# WARNING: No tests generated by LLM"
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            with open(file_path, "r") as f:
+                code = f.read()
+        except Exception as e:
+            print(f"Ignoring previous suite ({e}); regenerating everything.")
+            return None
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("base_url") != base_url:
+            return None
+        sections = manifest.get("sections", {})
+        header, bodies = split_suite(code, set(sections))
+        if set(bodies) != set(sections):
+            print("Previous suite is missing some of its sections; regenerating everything.")
+            return None
+        return header, bodies, sections
+
+    def _build_prompt(self, endpoints: List[Dict[str, Any]], base_url: str) -> str:
+        # One line per endpoint instead of an indented block: same information, far fewer tokens
+        return (
+            "Write a pytest script for these API endpoints.\n"
+            f"Base URL: {base_url}\n"
+            "Endpoints (method, path, JSON payload schema or '-'):\n"
+            f"{endpoint_table(endpoints)}\n"
+            "\n"
+            "REQUIREMENTS:\n"
+            "1. Use 'import pytest' and 'import requests'.\n"
+            "2. Define a fixture 'base_url'.\n"
+            "3. Write test functions starting with 'test_'.\n"
+            "4. CRITICAL: When asserting status code, ALWAYS print the response text if it fails.\n"
+            "   Example: assert response.status_code == 200, "
+            "f\"Expected 200 but got {response.status_code}. Response: {response.text}\"\n"
+            "5. Return ONLY raw python code.\n"
+        )
+
+    def _generate_batch(self, label: str, endpoints: List[Dict[str, Any]], base_url: str,
+                        on_chunk: Optional[Callable[[str, str], None]] = None, use_cache: bool = True) -> str:
+        prompt = self._build_prompt(endpoints, base_url)
+        print(f"[{label}] Sending prompt to LLM ({len(endpoints)} endpoints, {len(prompt)} chars)...")
+        stream = (lambda text: on_chunk(text, label)) if on_chunk else None
+        code = self._clean_code(self.client.generate_content(prompt, use_cache=use_cache, on_chunk=stream))
+        # A batch that doesn't validate (after one repair attempt) can't be merged, so it counts as failed
+        return validate_or_repair(code, self.client, self._clean_code, label, known_fixtures=SHARED_FIXTURES,
+                                  prompt=prompt)
+
+    def generate_test_suite(self, project_name: str, endpoints: List[Dict[str, Any]], base_url: str = "http://localhost:5000",
+                            incremental: bool = True, on_chunk: Optional[Callable[[str, str], None]] = None,
+                            use_cache: bool = True) -> str:
+        """
+        Writes tests/generated/test_<project>.py and returns its path ("" on failure).
 
+        With `incremental`, the suite is diffed against the manifest written last
+        time: only sections whose endpoints were added or changed are sent to the
+        LLM, sections for removed routes are dropped, and all other sections
+        (including healed ones) are kept byte for byte. Endpoints the template
+        policy picks (see test_templates) are rendered locally, without an LLM call.
+
+        `on_chunk(text, label)` receives the code of each section as it is
+        generated (streamed from the LLM, so batches interleave). The suite and
+        its manifest are only replaced once everything has finished.
+
+        With `use_cache=False`, batches are sent to the LLM even if the same prompt
+        was answered before (e.g. for a full regeneration after bad answers).
+        """
+        print(f"Generating tests for {project_name}...")
+
+        try:
             filename = f"test_{project_name}.py"
             # Fix: ensure absolute path or correct relative path
             file_path = os.path.join(os.getcwd(), self.test_output_dir, filename)
-            
+
+            batches = self._batch_endpoints(endpoints)
+            fingerprints = [sorted(self._fingerprint(ep) for ep in eps) for _, eps, _ in batches]
+            previous = self._load_previous(file_path, base_url) if incremental else None
+            header, old_bodies, old_sections = previous or (None, {}, {})
+
+            todo = [
+                i for i, (label, _, _) in enumerate(batches)
+                if old_sections.get(label, {}).get("fingerprints") != fingerprints[i]
+                or old_sections[label].get("failed")
+            ]
+            removed = set(old_sections) - {label for label, _, _ in batches}
+            templated = [i for i in todo if batches[i][2]]
+            llm_todo = [i for i in todo if not batches[i][2]]
+            print(f"{len(batches)} sections: {len(batches) - len(todo)} unchanged, {len(templated)} from templates, "
+                  f"{len(llm_todo)} to generate, {len(removed)} removed (up to {self.concurrency} LLM calls in flight).")
+
+            # Batches run concurrently; results are merged in batch order so the
+            # suite is laid out the same way whatever order the LLM answers in
+            outputs: Dict[int, str] = {}
+            for i in templated:
+                code = render_test_module(batches[i][1])
+                # Checked like LLM output; a template that doesn't validate is generated instead
+                report = validate_test_code(code, known_fixtures=SHARED_FIXTURES)
+                if not report["valid"]:
+                    print(f"[{batches[i][0]}] Template output failed validation "
+                          f"({'; '.join(report['errors'])}); generating it with the LLM instead.")
+                    llm_todo.append(i)
+                    continue
+                outputs[i] = code
+                if on_chunk:
+                    on_chunk(code, batches[i][0])
+            errors: Dict[int, Exception] = {}
+            if llm_todo:
+                # Plugins are imported once, up front: importing them while other
+                # threads parse generated code trips up the ast module on some Pythons
+                plugin_fixtures()
+                with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(llm_todo)))) as pool:
+                    futures = {
+                        pool.submit(self._generate_batch, batches[i][0], batches[i][1], base_url, on_chunk, use_cache): i
+                        for i in llm_todo
+                    }
+                    for future in as_completed(futures):
+                        i = futures[future]
+                        try:
+                            outputs[i] = future.result()
+                        except Exception as e:
+                            print(f"[{batches[i][0]}] Generation failed: {e}")
+                            errors[i] = e
+
+            if errors and not outputs and len(errors) == len(batches):
+                # Nothing to merge: surface the first error like a single-call failure
+                raise errors[min(errors)]
+            if not batches:
+                raise ValueError("No endpoints to generate tests for")
+
+            parts = []
+            for i, (label, eps, _) in enumerate(batches):
+                if i in outputs:
+                    parts.append({"label": label, "code": outputs[i]})
+                elif i in errors:
+                    not_covered = ", ".join(f"{ep.get('method')} {ep.get('path')}" for ep in eps)
+                    parts.append({"label": label, "error": f"{type(errors[i]).__name__}: {errors[i]}. Not covered: {not_covered}"})
+                else:
+                    parts.append({"label": label, "code": old_bodies[label], "verbatim": True})
+            generated_code = merge_test_modules(parts, base_url, header=header)
+            print(f"Merged suite: {len(outputs)} generated, {len(errors)} failed, "
+                  f"{len(batches) - len(todo)} kept, {len(generated_code)} chars.")
+
             # Ensure directory exists
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            with open(file_path, "w") as f:
+
+            # Written beside the targets and renamed over them, so a run or a
+            # streaming client never sees a half-written suite
+            manifest_path = self._manifest_path(file_path)
+            with open(f"{file_path}.tmp", "w") as f:
                 f.write(generated_code)
-                
+            with open(f"{manifest_path}.tmp", "w") as f:
+                json.dump({
+                    "version": MANIFEST_VERSION,
+                    "base_url": base_url,
+                    "sections": {
+                        label: {"fingerprints": fingerprints[i], "failed": i in errors, "template": is_template}
+                        for i, (label, _, is_template) in enumerate(batches)
+                    }
+                }, f, indent=2)
+            os.replace(f"{file_path}.tmp", file_path)
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+
             print(f"Test suite saved to: {file_path}")
             return file_path
 
         except Exception as e:
             print(f"Error generating tests: {e}")
-            return ""
\ No newline at end of file
+            return ""
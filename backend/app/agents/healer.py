@@ -1,27 +1,51 @@
 import os
+import re
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional, List, Tuple
 from dotenv import load_dotenv
-from .llm_client import GeminiClient
+from .llm_client import get_gemini_client
+from .suite_merger import split_suite, merge_test_modules
+from .test_validator import validate_test_code, validate_or_repair
+from .prompt_budget import PROMPT_TOKEN_BUDGET, estimate_tokens, trim_text, window_around, names_mentioned, remaining_budget
 
 # Load environment variables
 load_dotenv()
 
 class SelfHealingAgent:
     def __init__(self):
-        self.client = GeminiClient()
+        self.client = get_gemini_client()
 
-    def heal_test_case(self, test_file_path: str, failure_logs: str) -> Dict[str, Any]:
+    def heal_test_case(self, test_file_path: str, failure_logs: str,
+                       on_chunk: Optional[Callable[[str], None]] = None, use_cache: bool = True) -> Dict[str, Any]:
         """
         Scenario A: The Test is Broken (False Positive).
         Reads the failing test file and the error logs, then asks Gemini to rewrite 
         the test code to match the actual API behavior.
+        With `on_chunk`, the rewritten code is streamed to it as Gemini produces it.
+        `use_cache=False` asks Gemini again even if the same prompt was answered before.
+
+        The failure report is trimmed to a quarter of PROMPT_TOKEN_BUDGET. When the
+        test file doesn't fit in the rest, only the suite sections with failing
+        tests are sent and the healed sections are spliced back into the file.
         """
         print(f"Attempting to heal test file: {test_file_path}")
 
         try:
             with open(test_file_path, "r") as f:
-                current_test_code = f.read()
+                full_test_code = f.read()
+
+            failure_logs = trim_text(failure_logs, PROMPT_TOKEN_BUDGET // 4, "report lines")
+            current_test_code, failing_labels = full_test_code, None
+            code_budget = remaining_budget(failure_logs)
+            if estimate_tokens(full_test_code) > code_budget:
+                current_test_code, failing_labels = self._failing_sections(full_test_code, failure_logs)
+                if estimate_tokens(current_test_code) > code_budget:
+                    return {"status": "error",
+                            "message": f"Healing failed: the failing tests need ~{estimate_tokens(current_test_code)} "
+                                       f"tokens but only {code_budget} fit in PROMPT_TOKEN_BUDGET."}
+            scope_note = ("" if failing_labels is None else
+                          "NOTE: The suite is too large to send whole. Only its header and the sections containing "
+                          "failing tests are included below; return exactly those, with their section comment lines.")
 
             # Prompt for the Healer Agent
             prompt = f"""
@@ -30,6 +54,8 @@ class SelfHealingAgent:
             **Objective:**
             Fix the provided 'pytest' script so that ALL tests pass. The API implementation is considered the "Source of Truth" — if the test expects 200 but gets 201, CHANGE THE TEST to expect 201.
             
+            {scope_note}
+
             **Input Data:**
             1. **Failing Test Code:**
             ```python
@@ -47,6 +73,7 @@ class SelfHealingAgent:
                - If the API returns different JSON keys, update the test to check for the keys that actually exist.
                - If the API requires specific headers or payload formats that are missing, add them.
             4. **Preserve Structure:** Keep the existing imports and helper functions unless they are the cause of the error. Do not delete working tests.
+               Keep every `# --- section: ... ---` comment line exactly as it is; they let later regenerations update the suite section by section.
             5. **Output Format:** Return ONLY the complete, valid, executable Python code. Do not include markdown blocks (```python ... ```) or explanations. Just the code.
             
             **Thinking Process (Internal):**
@@ -58,22 +85,22 @@ class SelfHealingAgent:
             """
 
             # Use centralized client
-            fixed_code = self.client.generate_content(prompt).strip()
-
-            # Clean formatting if Gemini adds markdown
-            if fixed_code.startswith("```python"):
-                fixed_code = fixed_code.replace("```python", "", 1)
-            if fixed_code.startswith("```"):
-                fixed_code = fixed_code.replace("```", "", 1)
-            if fixed_code.endswith("```"):
-                fixed_code = fixed_code.replace("```", "", 1) # Only replace the last one
-            
-            # Extra cleanup for trailing backticks if the replace above missed (e.g. whitespace)
-            fixed_code = fixed_code.strip("`").strip()
+            fixed_code = self._clean_code(self.client.generate_content(prompt, use_cache=use_cache, on_chunk=on_chunk))
+
+            # Nothing is written unless it parses, imports and fixtures resolve and no
+            # test went missing; a broken answer gets one cheap repair round trip
+            sent_tests = validate_test_code(current_test_code)["test_count"]
+            fixed_code = validate_or_repair(fixed_code, self.client, self._clean_code, "heal",
+                                            path=test_file_path, min_tests=max(1, sent_tests), prompt=prompt)
 
-            # Overwrite the test file with the healed version
-            with open(test_file_path, "w") as f:
+            if failing_labels is not None:
+                fixed_code = self._splice_sections(full_test_code, fixed_code, failing_labels)
+
+            # Overwrite the test file with the healed version (via a rename, so a
+            # concurrent test run sees either the old or the new file, never half of one)
+            with open(f"{test_file_path}.tmp", "w") as f:
                 f.write(fixed_code)
+            os.replace(f"{test_file_path}.tmp", test_file_path)
 
             return {
                 "status": "healed",
@@ -84,11 +111,58 @@ class SelfHealingAgent:
         except Exception as e:
             return {"status": "error", "message": f"Healing failed: {str(e)}"}
 
-    def diagnose_backend_bug(self, source_file_path: str, error_logs: str) -> Dict[str, Any]:
+    @staticmethod
+    def _clean_code(text: str) -> str:
+        fixed_code = text.strip()
+
+        # Clean formatting if Gemini adds markdown
+        if fixed_code.startswith("```python"):
+            fixed_code = fixed_code.replace("```python", "", 1)
+        if fixed_code.startswith("```"):
+            fixed_code = fixed_code.replace("```", "", 1)
+        if fixed_code.endswith("```"):
+            fixed_code = fixed_code.replace("```", "", 1) # Only replace the last one
+        
+        # Extra cleanup for trailing backticks if the replace above missed (e.g. whitespace)
+        return fixed_code.strip("`").strip()
+
+    @staticmethod
+    def _failing_sections(code: str, failure_logs: str) -> Tuple[str, Optional[List[str]]]:
+        """
+        The suite cut down to its header and the sections whose tests appear in
+        the failure report, with their labels; the whole suite and None when it
+        has no sections (or none of them failed).
+        """
+        header, bodies = split_suite(code)
+        labels = [
+            label for label, body in bodies.items()
+            if names_mentioned(re.findall(r"^(?:async )?def (test_\w+)", body, re.M), failure_logs)
+        ]
+        if not labels:
+            return code, None
+        parts = [{"label": label, "code": bodies[label], "verbatim": True} for label in labels]
+        return merge_test_modules(parts, base_url="", header=header), labels
+
+    @staticmethod
+    def _splice_sections(code: str, healed: str, labels: List[str]) -> str:
+        """Puts the healed sections (and header) back into the full suite."""
+        header, bodies = split_suite(code)
+        healed_header, healed_bodies = split_suite(healed, set(labels))
+        missing = set(labels) - set(healed_bodies)
+        if missing:
+            raise ValueError(f"healed code lost the markers of sections {sorted(missing)}; test file left unchanged")
+        parts = [{"label": label, "code": healed_bodies.get(label, body), "verbatim": True} for label, body in bodies.items()]
+        return merge_test_modules(parts, base_url="", header=healed_header or header)
+
+    def diagnose_backend_bug(self, source_file_path: str, error_logs: str,
+                             on_chunk: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         Scenario B: The Code is Broken (True Bug/500 Error).
         Reads the user's MERN (Node.js) source code and the stack trace, 
         then generates a fix explanation and code snippet.
+        With `on_chunk`, the raw response is streamed to it as Gemini produces it.
+        Oversized logs are trimmed, and an oversized source file is cut down to
+        the lines around those the stack trace points at.
         """
         print(f"Diagnosing backend bug in: {source_file_path}")
 
@@ -99,6 +173,11 @@ class SelfHealingAgent:
             with open(source_file_path, "r") as f:
                 source_code = f.read()
 
+            error_logs = trim_text(error_logs, PROMPT_TOKEN_BUDGET // 4, "log lines")
+            name = re.escape(os.path.basename(source_file_path))
+            trace_lines = [int(n) for n in re.findall(rf"{name}:(\d+)", error_logs)]
+            source_code = window_around(source_code, trace_lines, remaining_budget(error_logs), "source lines")
+
             # Prompt for the Diagnosis Agent
             prompt = f"""
             You are a Senior Backend Developer.
@@ -129,7 +208,7 @@ class SelfHealingAgent:
             """
 
             # Use centralized client
-            cleaned_response = self.client.generate_content(prompt).strip()
+            cleaned_response = self.client.generate_content(prompt, on_chunk=on_chunk).strip()
             
             # Remove markdown formatting if present
             if cleaned_response.startswith("```json"):
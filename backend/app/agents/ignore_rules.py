@@ -0,0 +1,140 @@
+import os
+import re
+from typing import List, Optional, Iterable, Tuple
+
+# Folders that hold dependencies, build output or tooling state rather than the
+# user's own routes. Override with SCAN_IGNORE_DIRS="node_modules,.git,...".
+DEFAULT_IGNORED_DIRS = {'node_modules', '.git', 'dist', 'build', 'vendor', 'venv', '.venv', '__pycache__'}
+
+SCAN_IGNORE_DIRS = {
+    d.strip() for d in os.getenv("SCAN_IGNORE_DIRS", ",".join(sorted(DEFAULT_IGNORED_DIRS))).split(",") if d.strip()
+}
+# Route files are small; anything bigger is generated or bundled code
+SCAN_MAX_FILE_BYTES = int(os.getenv("SCAN_MAX_FILE_BYTES", str(1024 * 1024)))
+
+BINARY_SNIFF_BYTES = 8192
+
+def looks_binary(data: bytes) -> bool:
+    """Same heuristic git uses: a NUL byte near the start means binary."""
+    return b'\0' in data[:BINARY_SNIFF_BYTES]
+
+def _pattern_to_regex(pattern: str) -> str:
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex += '/.*'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                regex += re.escape('[')
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                regex += f'[{body}]'
+                i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+class GitIgnore:
+    """
+    Matcher for .gitignore files. Supports comments, negation (!), directory-only
+    patterns (trailing /), anchored patterns, wildcards and **. Rules from nested
+    .gitignore files apply below their own folder; later rules win.
+    """
+    def __init__(self):
+        # (base folder, compiled pattern, negated, directory only)
+        self.rules: List[Tuple[str, re.Pattern, bool, bool]] = []
+
+    def add_file(self, text: str, base: str = ''):
+        base = base.strip('/')
+        for line in text.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            anchored = '/' in line
+            line = line.lstrip('/')
+            regex = _pattern_to_regex(line)
+            if not anchored:
+                regex = '(?:.*/)?' + regex
+            self.rules.append((base, re.compile(regex + '$'), negated, dir_only))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def _match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        result = None
+        for base, regex, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + '/'):
+                    continue
+                candidate = rel_path[len(base) + 1:]
+            else:
+                candidate = rel_path
+            if regex.match(candidate):
+                result = not negated
+        return result
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        `rel_path` uses forward slashes relative to the project root. A path is
+        ignored if it, or any folder above it, is ignored.
+        """
+        parts = rel_path.strip('/').split('/')
+        for depth in range(1, len(parts) + 1):
+            path_is_dir = is_dir or depth < len(parts)
+            if self._match('/'.join(parts[:depth]), path_is_dir):
+                return True
+        return False
+
+class ScanFilter:
+    """
+    Decides which files the scanner reads: skips ignored folder names, paths
+    matched by .gitignore and files over the size limit.
+    """
+    def __init__(self, ignored_dirs: Optional[Iterable[str]] = None, max_file_bytes: Optional[int] = None):
+        self.ignored_dirs = set(SCAN_IGNORE_DIRS if ignored_dirs is None else ignored_dirs)
+        self.max_file_bytes = SCAN_MAX_FILE_BYTES if max_file_bytes is None else max_file_bytes
+        self.gitignore = GitIgnore()
+
+    def is_ignored_dir(self, rel_dir: str) -> bool:
+        if os.path.basename(rel_dir) in self.ignored_dirs:
+            return True
+        return bool(self.gitignore) and self.gitignore.is_ignored(rel_dir, is_dir=True)
+
+    def is_ignored_file(self, rel_path: str, size: Optional[int] = None) -> bool:
+        parts = rel_path.split('/')
+        if any(part in self.ignored_dirs for part in parts[:-1]):
+            return True
+        if size is not None and size > self.max_file_bytes:
+            return True
+        return bool(self.gitignore) and self.gitignore.is_ignored(rel_path)
@@ -1,8 +1,14 @@
 import os
-import time
+import queue
 import random
+import asyncio
+import threading
 import google.generativeai as genai
+from typing import Any, Callable, Dict, List, Iterator, AsyncIterator, Awaitable, Optional
 from dotenv import load_dotenv
+from .llm_cache import LLMCache, get_llm_cache
+from .prompt_budget import log_usage, estimate_tokens
+from .rate_limiter import get_rate_limiter
 
 load_dotenv()
 
@@ -14,6 +20,59 @@ class GeminiRateLimitError(Exception):
     """Raised after several retries when a short-term rate limit persists."""
     pass
 
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """
+    The event loop every Gemini call runs on. It lives on its own daemon thread,
+    so sync callers (FastAPI threadpool handlers, generation batches) hand their
+    call over and block only on the result, never on a backoff sleep.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="gemini-client-loop", daemon=True).start()
+        return _loop
+
+class _Flight:
+    """One request in flight and the text it has produced so far, for everyone waiting on it."""
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def add(self, text: str):
+        self.chunks.append(text)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        seen = 0
+        while True:
+            # Taken before looking, so a change made while we yield isn't missed
+            changed = self._changed
+            while seen < len(self.chunks):
+                yield self.chunks[seen]
+                seen += 1
+            if self.done:
+                if self.error:
+                    raise self.error
+                return
+            await changed.wait()
+
 class GeminiClient:
     def __init__(self, model_name: str = None):
         self.api_key = os.getenv("GEMINI_API_KEY")
@@ -32,17 +91,211 @@ class GeminiClient:
         self.model_name = model_name or env_model
         
         self.model = genai.GenerativeModel(self.model_name)
+        # Shared on-disk response cache (None when disabled)
+        self.cache = get_llm_cache()
+        # Shared by every client of this model in the process
+        self.limiter = get_rate_limiter(self.model_name)
+        # Requests in flight by cache key, so identical concurrent calls share one
+        # (only touched from the background loop)
+        self._in_flight: Dict[str, _Flight] = {}
+        self.coalesced_calls = 0
+
+    def generate_content(self, prompt: str, max_retries: int = 3, base_delay: float = 2.0, use_cache: bool = True,
+                         on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Blocking wrapper around agenerate_content for code running on threads.
+
+        With `on_chunk`, the response is streamed and each piece of text is passed
+        to it as it arrives; the full text is still returned at the end.
+        """
+        if on_chunk:
+            chunks = []
+            for chunk in self.generate_content_stream(prompt, max_retries, base_delay, use_cache):
+                chunks.append(chunk)
+                on_chunk(chunk)
+            return "".join(chunks)
+        future = asyncio.run_coroutine_threadsafe(
+            self.agenerate_content(prompt, max_retries, base_delay, use_cache), _background_loop()
+        )
+        return future.result()
+
+    def forget(self, prompt: str):
+        """Drops the cached answer to `prompt`, e.g. because it turned out to be unusable."""
+        if self.cache:
+            self.cache.delete(self.model_name, prompt)
+
+    def generate_content_stream(self, prompt: str, max_retries: int = 3, base_delay: float = 2.0,
+                                use_cache: bool = True) -> Iterator[str]:
+        """Blocking wrapper around agenerate_content_stream: yields pieces as the loop receives them."""
+        pieces: "queue.Queue" = queue.Queue()
+
+        async def pump():
+            try:
+                async for text in self.agenerate_content_stream(prompt, max_retries, base_delay, use_cache):
+                    pieces.put(("chunk", text))
+                pieces.put(("done", None))
+            except Exception as e:
+                pieces.put(("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), _background_loop())
+        try:
+            while True:
+                kind, value = pieces.get()
+                if kind == "error":
+                    raise value
+                if kind == "done":
+                    return
+                yield value
+        finally:
+            # A caller that stops early stops following the request (cancelling it if nobody else is)
+            future.cancel()
+
+    async def agenerate_content(self, prompt: str, max_retries: int = 3, base_delay: float = 2.0,
+                                use_cache: bool = True) -> str:
+        """
+        Generates content using Gemini with automatic retry and jittered exponential
+        backoff. Calls wait their turn in the model's rate limiter, and backoff
+        sleeps don't block anything. Identical prompts to the same model are
+        answered from the response cache unless `use_cache` is False (the fresh
+        answer is still stored), and identical calls already in flight are
+        joined instead of sent again.
+        """
+        if use_cache and self.cache:
+            cached = await self._in_executor(self.cache.get, self.model_name, prompt)
+            if cached is not None:
+                print(f"[{self.model_name}] Response cache hit ({len(prompt)} char prompt)")
+                return cached
+        return "".join([text async for text in self._single_flight(prompt, False, max_retries, base_delay)])
+
+    async def agenerate_content_stream(self, prompt: str, max_retries: int = 3, base_delay: float = 2.0,
+                                       use_cache: bool = True) -> AsyncIterator[str]:
+        """
+        Yields the response text piece by piece as Gemini produces it. A cached
+        answer comes out as a single piece; joining a call already in flight
+        replays what it has received so far, then follows it. Rate limits are
+        only retried before the first piece; a stream that breaks off later
+        raises, since the caller has already seen part of the answer.
+        """
+        if use_cache and self.cache:
+            cached = await self._in_executor(self.cache.get, self.model_name, prompt)
+            if cached is not None:
+                print(f"[{self.model_name}] Response cache hit ({len(prompt)} char prompt)")
+                yield cached
+                return
+        async for text in self._single_flight(prompt, True, max_retries, base_delay):
+            yield text
 
-    def generate_content(self, prompt: str, max_retries: int = 3, base_delay: float = 2.0) -> str:
+    async def _single_flight(self, prompt: str, stream: bool, max_retries: int, base_delay: float) -> AsyncIterator[str]:
         """
-        Generates content using Gemini with automatic retry and exponential backoff.
+        Runs the request for `prompt` unless the same one is already in flight, in
+        which case the caller shares it. The request runs as its own task, so one
+        caller going away doesn't cut it short for the others; it is cancelled
+        once nobody is following it any more.
         """
+        key = LLMCache.make_key(self.model_name, prompt)
+        flight = self._in_flight.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._in_flight[key] = flight
+            flight.task = asyncio.create_task(self._fly(key, flight, prompt, stream, max_retries, base_delay))
+        else:
+            self.coalesced_calls += 1
+            print(f"[{self.model_name}] Joined an identical request in flight ({len(prompt)} char prompt)")
+
+        flight.followers += 1
+        try:
+            async for text in flight.follow():
+                yield text
+        finally:
+            flight.followers -= 1
+            if not flight.followers and not flight.done:
+                flight.task.cancel()
+
+    async def _fly(self, key: str, flight: "_Flight", prompt: str, stream: bool, max_retries: int, base_delay: float):
+        try:
+            if stream:
+                async for text in self._stream_uncached(prompt, max_retries, base_delay):
+                    flight.add(text)
+            else:
+                flight.add(await self._generate_uncached(prompt, max_retries, base_delay))
+            flight.finish()
+        except asyncio.CancelledError as e:
+            flight.finish(e)
+            raise
+        except Exception as e:
+            # Handed to every follower; nobody awaits this task itself
+            flight.finish(e)
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _generate_uncached(self, prompt: str, max_retries: int, base_delay: float) -> str:
+        async def call():
+            async with self.limiter.slot(estimate_tokens(prompt)):
+                return await self.model.generate_content_async(prompt)
+
+        response = await self._with_retries(call, max_retries, base_delay)
+        text = response.text
+        log_usage(self.model_name, prompt, text, getattr(response, "usage_metadata", None))
+        if self.cache and text:
+            await self._in_executor(self.cache.put, self.model_name, prompt, text)
+        return text
+
+    async def _stream_uncached(self, prompt: str, max_retries: int, base_delay: float) -> AsyncIterator[str]:
+        """The streaming request itself; it holds its limiter slot until the stream ends."""
+        async def start():
+            # Errors such as 429 surface when the request is made or on the first chunk
+            await self.limiter.acquire(estimate_tokens(prompt))
+            try:
+                chunks = (await self.model.generate_content_async(prompt, stream=True)).__aiter__()
+                return await anext(chunks, None), chunks
+            except BaseException:
+                self.limiter.release()
+                raise
+
+        first, rest = await self._with_retries(start, max_retries, base_delay)
+        pieces = []
+        usage = None
+        try:
+            chunk = first
+            while chunk is not None:
+                # Token counts arrive with the chunks; the last ones cover the whole answer
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text (e.g. only a finish reason) have nothing to show
+                    text = ""
+                if text:
+                    pieces.append(text)
+                    yield text
+                chunk = await anext(rest, None)
+        finally:
+            self.limiter.release()
+
+        full_text = "".join(pieces)
+        log_usage(self.model_name, prompt, full_text, usage)
+        if self.cache and full_text:
+            await self._in_executor(self.cache.put, self.model_name, prompt, full_text)
+
+    @staticmethod
+    async def _in_executor(func: Callable[..., Any], *args) -> Any:
+        """Runs blocking work (cache reads and writes hit SQLite) without stalling the shared loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "coalesced_calls": self.coalesced_calls,
+            "requests_in_flight": len(self._in_flight),
+            "rate_limiter": self.limiter.stats(),
+        }
+
+    async def _with_retries(self, call: Callable[[], Awaitable[Any]], max_retries: int, base_delay: float) -> Any:
         last_exception = None
 
         for attempt in range(max_retries + 1):
             try:
-                response = self.model.generate_content(prompt)
-                return response.text
+                return await call()
             except Exception as e:
                 last_exception = e
                 msg = str(e)
@@ -55,10 +308,13 @@ class GeminiClient:
                 # Check for Rate Limit / 429 (Retryable)
                 if "429" in msg or "rate limit" in msg.lower():
                     if attempt < max_retries:
-                        # Exponential backoff
-                        delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
+                        # Exponential backoff with full jitter, so callers that were
+                        # throttled together don't all come back at the same moment
+                        delay = random.uniform(0.5, 1.5) * base_delay * (2 ** attempt)
                         print(f"[{self.model_name}] Rate limit hit (429). Retrying in {delay:.2f}s... (Attempt {attempt+1}/{max_retries})")
-                        time.sleep(delay)
+                        # Everyone else waits too, rather than piling more requests onto the limit
+                        self.limiter.pause(delay)
+                        await asyncio.sleep(delay)
                         continue
                     else:
                         raise GeminiRateLimitError(f"Gemini rate limit hit after {max_retries} retries: {msg}") from e
@@ -68,3 +324,14 @@ class GeminiClient:
         
         # Should not be reached if logic is correct, but as a fallback
         raise last_exception if last_exception else Exception("Unknown error in generate_content")
+
+_client: Optional[GeminiClient] = None
+_client_lock = threading.Lock()
+
+def get_gemini_client() -> GeminiClient:
+    """The process-wide client shared by the generator, the healer and anything else calling Gemini."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
@@ -0,0 +1,129 @@
+import os
+import re
+import json
+import math
+from typing import List, Dict, Any, Optional
+
+# Upper bound for one prompt; oversized inputs are trimmed to fit within it
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "30000"))
+# Room kept for the fixed instructions around the inputs of a prompt
+INSTRUCTION_TOKENS = 1000
+# Rough tokens-per-character ratio of Gemini's tokenizer for code and English
+CHARS_PER_TOKEN = 4
+# Room for the "... [N lines omitted ...] ..." note that replaces trimmed text
+OMISSION_NOTE_CHARS = 80
+# Price per million tokens, used for the cost estimate logged with every call
+LLM_INPUT_USD_PER_MTOK = float(os.getenv("LLM_INPUT_USD_PER_MTOK", "1.25"))
+LLM_OUTPUT_USD_PER_MTOK = float(os.getenv("LLM_OUTPUT_USD_PER_MTOK", "10.0"))
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+def estimate_cost(prompt_tokens: int, response_tokens: int) -> float:
+    return (prompt_tokens * LLM_INPUT_USD_PER_MTOK + response_tokens * LLM_OUTPUT_USD_PER_MTOK) / 1_000_000
+
+def log_usage(model_name: str, prompt: str, response: str, usage: Any = None):
+    """
+    Prints the size and estimated cost of one call. Uses the token counts the
+    API reported (`usage_metadata`) when there are any, estimates otherwise.
+    """
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt)
+    response_tokens = getattr(usage, "candidates_token_count", 0) or estimate_tokens(response)
+    source = "reported" if getattr(usage, "prompt_token_count", 0) else "estimated"
+    over = " (over PROMPT_TOKEN_BUDGET)" if prompt_tokens > PROMPT_TOKEN_BUDGET else ""
+    print(f"[{model_name}] Prompt {len(prompt)} chars / {prompt_tokens} tokens{over}, "
+          f"response {response_tokens} tokens ({source}), est. cost ${estimate_cost(prompt_tokens, response_tokens):.4f}")
+
+def endpoint_table(endpoints: List[Dict[str, Any]]) -> str:
+    """One dense line per endpoint: '<n>. METHOD /path payload' (payload as compact JSON, '-' if none)."""
+    lines = []
+    for i, ep in enumerate(endpoints, start=1):
+        payload = ep.get("payload_schema")
+        payload = json.dumps(payload, separators=(",", ":"), sort_keys=True) if payload else "-"
+        lines.append(f"{i}. {ep.get('method')} {ep.get('path')} {payload}")
+    return "\n".join(lines)
+
+def trim_text(text: str, max_tokens: int, what: str = "lines") -> str:
+    """
+    Fits `text` into `max_tokens` by keeping its first and last lines (where
+    imports, headers and the end of a traceback usually are) and replacing the
+    middle with a note saying how much was left out.
+    """
+    text = text or ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN - OMISSION_NOTE_CHARS)
+    lines = text.splitlines()
+    head: List[str] = []
+    tail: List[str] = []
+    used = 0
+    # Alternate head and tail, favouring the head two to one
+    i, j = 0, len(lines) - 1
+    turn = 0
+    while i <= j:
+        take_head = turn % 3 != 2
+        line = lines[i] if take_head else lines[j]
+        if used + len(line) + 1 > max_chars:
+            break
+        used += len(line) + 1
+        if take_head:
+            head.append(line)
+            i += 1
+        else:
+            tail.append(line)
+            j -= 1
+        turn += 1
+    omitted = j - i + 1
+    if not head and not tail:
+        # A single huge line: cut it by characters instead
+        return text[:max_chars] + f"\n... [{len(text) - max_chars} characters omitted to fit the prompt budget] ..."
+    return "\n".join(head + [f"... [{omitted} {what} omitted to fit the prompt budget] ..."] + tail[::-1])
+
+def window_around(text: str, line_numbers: List[int], max_tokens: int, what: str = "lines") -> str:
+    """
+    Fits `text` into `max_tokens` by keeping the lines around `line_numbers`
+    (1-based, e.g. taken from a stack trace), widening the window around each
+    of them until the budget is spent. Falls back to trim_text without any.
+    """
+    text = text or ""
+    lines = text.splitlines()
+    targets = sorted({n - 1 for n in line_numbers if 0 < n <= len(lines)})
+    if estimate_tokens(text) <= max_tokens or not targets:
+        return trim_text(text, max_tokens, what)
+    # Each window can end up with an omission note on either side
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN - OMISSION_NOTE_CHARS * (len(targets) + 1))
+    keep = set()
+    used = 0
+    radius = 0
+    while radius < len(lines):
+        added = [i for t in targets for i in (t - radius, t + radius) if 0 <= i < len(lines) and i not in keep]
+        cost = sum(len(lines[i]) + 1 for i in set(added))
+        if used + cost > max_chars:
+            break
+        keep.update(added)
+        used += cost
+        radius += 1
+
+    out: List[str] = []
+    skipped = 0
+    for i, line in enumerate(lines):
+        if i in keep:
+            if skipped:
+                out.append(f"... [{skipped} {what} omitted to fit the prompt budget] ...")
+                skipped = 0
+            out.append(line)
+        else:
+            skipped += 1
+    if skipped:
+        out.append(f"... [{skipped} {what} omitted to fit the prompt budget] ...")
+    return "\n".join(out)
+
+def names_mentioned(names: List[str], text: str) -> List[str]:
+    """The names that appear as whole words in `text` (e.g. test names in a failure report)."""
+    return [name for name in names if re.search(rf"\b{re.escape(name)}\b", text or "")]
+
+def remaining_budget(*texts: Optional[str], budget: Optional[int] = None,
+                     reserve: int = INSTRUCTION_TOKENS) -> int:
+    """Tokens left for an input once `texts` and the prompt's instructions are counted."""
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    return max(0, budget - reserve - sum(estimate_tokens(t or "") for t in texts))
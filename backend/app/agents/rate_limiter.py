@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Tuple, AsyncIterator
+
+# Published per-project limits (requests per minute, input tokens per minute);
+# GEMINI_RPM / GEMINI_TPM override them for other tiers or models
+MODEL_LIMITS: Dict[str, Tuple[int, int]] = {
+    "gemini-2.5-pro": (150, 2_000_000),
+    "gemini-2.5-flash": (1000, 1_000_000),
+    "gemini-2.5-flash-lite": (4000, 4_000_000),
+    "gemini-2.0-flash": (2000, 4_000_000),
+}
+DEFAULT_LIMITS = (60, 1_000_000)
+# Calls to one model in flight at once, across everything in this process
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+def model_limits(model_name: str) -> Tuple[int, int]:
+    rpm, tpm = MODEL_LIMITS.get(model_name, DEFAULT_LIMITS)
+    return int(os.getenv("GEMINI_RPM", rpm)), int(os.getenv("GEMINI_TPM", tpm))
+
+class TokenBucket:
+    """Holds up to `per_minute` units and refills continuously at that rate."""
+    def __init__(self, per_minute: int):
+        self.capacity = max(1, per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full one)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.available >= amount else (amount - self.available) / self.rate
+
+    def take(self, amount: float):
+        self.available -= min(amount, self.capacity)
+
+class RateLimiter:
+    """
+    Request and token buckets plus a concurrency cap for one model. Callers
+    queue in arrival order until both buckets have room and a slot is free, so
+    under load requests are spread out instead of all hitting 429 at once.
+    After a 429, `pause` holds back everyone, not just the caller that got it.
+
+    Must only be used from one event loop (the client's background loop).
+    """
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int = GEMINI_MAX_CONCURRENCY):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._queue = asyncio.Lock()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._paused_until = 0.0
+        self.waiting = 0
+        self.in_flight = 0
+        self.throttled = 0
+
+    async def acquire(self, tokens: int):
+        self.waiting += 1
+        try:
+            # asyncio.Lock wakes waiters first come, first served
+            async with self._queue:
+                while True:
+                    now = time.monotonic()
+                    wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now),
+                               self._paused_until - now)
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self._requests.take(1)
+                self._tokens.take(tokens)
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int) -> AsyncIterator[None]:
+        await self.acquire(tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def pause(self, seconds: float):
+        """Called on a 429: nobody starts a new call for `seconds`."""
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "throttled": self.throttled,
+        }
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(model_name: str) -> RateLimiter:
+    """The process-wide limiter for `model_name`, shared by every client of that model."""
+    with _limiters_lock:
+        if model_name not in _limiters:
+            _limiters[model_name] = RateLimiter(*model_limits(model_name))
+        return _limiters[model_name]
@@ -1,12 +1,15 @@
 import random
 import json
 import os
+import sqlite3
+import threading
 import numpy as np
 from typing import Dict, Any, List
 
 class RLEngine:
-    def __init__(self, storage_path: str = "storage/q_table.json"):
+    def __init__(self, storage_path: str = "storage/q_table.db", legacy_path: str = "storage/q_table.json"):
         self.storage_path = storage_path
+        self.legacy_path = legacy_path
         self.epsilon = 0.3  # Exploration rate (30% chance to try random new things)
         self.alpha = 0.1    # Learning rate
         self.gamma = 0.9    # Discount factor
@@ -20,22 +23,62 @@ class RLEngine:
             "type_mismatch"   # Send integers instead of strings
         ]
         
-        self.q_table = self._load_q_table()
+        self._local = threading.local()
+        self._init_db()
 
-    def _load_q_table(self) -> Dict[str, Dict[str, float]]:
+    def _connect(self) -> sqlite3.Connection:
         """
-        Loads the Q-Table from disk so learning persists between runs.
+        The Q-Table lives in SQLite so every worker process shares one copy and
+        each update is an atomic read-modify-write (one connection per thread).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.storage_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.storage_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS q_values ("
+            " state TEXT NOT NULL, action TEXT NOT NULL, q REAL NOT NULL DEFAULT 0,"
+            " updates INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (state, action))"
+        )
+        # One-time import of the JSON Q-Table used before the database existed
+        if os.path.exists(self.legacy_path):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT COUNT(*) FROM q_values").fetchone()[0] == 0:
+                    with open(self.legacy_path, 'r') as f:
+                        legacy = json.load(f)
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO q_values (state, action, q) VALUES (?, ?, ?)",
+                        [(state, action, q) for state, values in legacy.items() for action, q in values.items()]
+                    )
+                    print(f"[RLEngine] Imported {len(legacy)} states from {self.legacy_path}")
+                conn.execute("COMMIT")
+            except Exception as e:
+                conn.execute("ROLLBACK")
+                print(f"[RLEngine] Could not import {self.legacy_path}: {e}")
+
+    @property
+    def q_table(self) -> Dict[str, Dict[str, float]]:
+        """
+        Snapshot of the learned values.
         Structure: { "endpoint_path": { "action1": 0.0, "action2": 5.0 } }
         """
-        if os.path.exists(self.storage_path):
-            with open(self.storage_path, 'r') as f:
-                return json.load(f)
-        return {}
+        table: Dict[str, Dict[str, float]] = {}
+        for state, action, q in self._connect().execute("SELECT state, action, q FROM q_values"):
+            table.setdefault(state, {a: 0.0 for a in self.actions})[action] = q
+        return table
 
-    def save_q_table(self):
-        """Persists the agent's knowledge."""
-        with open(self.storage_path, 'w') as f:
-            json.dump(self.q_table, f, indent=4)
+    def _q_values(self, state: str) -> Dict[str, float]:
+        q_values = {action: 0.0 for action in self.actions}
+        for action, q in self._connect().execute("SELECT action, q FROM q_values WHERE state = ?", (state,)):
+            q_values[action] = q
+        return q_values
 
     def get_state(self, endpoint_path: str) -> str:
         """
@@ -50,17 +93,13 @@ class RLEngine:
         - Otherwise, exploit the best known strategy for this endpoint.
         """
         state = self.get_state(endpoint_path)
-        
-        # Initialize state in Q-table if new
-        if state not in self.q_table:
-            self.q_table[state] = {action: 0.0 for action in self.actions}
 
         # Exploration: Try something random
         if random.random() < self.epsilon:
             return random.choice(self.actions)
         
-        # Exploitation: Choose the action with the highest Q-value
-        q_values = self.q_table[state]
+        # Exploitation: Choose the action with the highest Q-value (unseen states are all 0.0)
+        q_values = self._q_values(state)
         best_action = max(q_values, key=q_values.get)
         return best_action
 
@@ -69,23 +108,38 @@ class RLEngine:
         Updates the Q-Value using the Bellman Equation:
         Q(s,a) = Q(s,a) + alpha * (reward + gamma * max(Q(s',a')) - Q(s,a))
         """
-        state = self.get_state(endpoint_path)
-        
-        if state not in self.q_table:
-            self.q_table[state] = {a: 0.0 for a in self.actions}
-            
-        current_q = self.q_table[state][action]
-        
-        # Since the 'next state' is the same endpoint (just the next iteration),
-        # we look at the max Q-value for this state currently.
-        max_future_q = max(self.q_table[state].values())
-        
-        # Calculate new Q-value
-        new_q = current_q + self.alpha * (reward + (self.gamma * max_future_q) - current_q)
-        self.q_table[state][action] = new_q
-        
-        self.save_q_table()
-        print(f"RL Update for {endpoint_path} | Action: {action} | Reward: {reward} | New Q-Val: {new_q:.2f}")
+        self.update_policies([endpoint_path], action, reward)
+
+    def update_policies(self, endpoint_paths: List[str], action: str, reward: float):
+        """
+        Applies the same update to several endpoints in one transaction. Each
+        state's read-modify-write happens under SQLite's write lock, so updates
+        from concurrent workers are never lost.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for endpoint_path in endpoint_paths:
+                state = self.get_state(endpoint_path)
+                q_values = self._q_values(state)
+                current_q = q_values[action]
+                
+                # Since the 'next state' is the same endpoint (just the next iteration),
+                # we look at the max Q-value for this state currently.
+                max_future_q = max(q_values.values())
+                
+                # Calculate new Q-value
+                new_q = current_q + self.alpha * (reward + (self.gamma * max_future_q) - current_q)
+                conn.execute(
+                    "INSERT INTO q_values (state, action, q, updates) VALUES (?, ?, ?, 1)"
+                    " ON CONFLICT (state, action) DO UPDATE SET q = excluded.q, updates = updates + 1",
+                    (state, action, new_q)
+                )
+                print(f"RL Update for {endpoint_path} | Action: {action} | Reward: {reward} | New Q-Val: {new_q:.2f}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
 
     def generate_mutation_payload(self, schema: Dict[str, Any], action: str) -> Dict[str, Any]:
         """
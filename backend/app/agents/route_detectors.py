@@ -0,0 +1,150 @@
+import os
+import re
+from typing import List, Dict, Tuple, Iterable, Callable, Optional
+
+# A detected route: (HTTP method, path)
+Route = Tuple[str, str]
+
+HTTP_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'PATCH')
+
+class RouteDetector:
+    """
+    One framework's route syntax. Patterns are compiled once when the detector is
+    built, and `prefilter` lists literal tokens of which at least one must appear
+    in the file for the pattern to possibly match, so most files never reach the
+    regex engine.
+    """
+    def __init__(self, name: str, pattern: str, prefilter: Iterable[str],
+                 extract: Optional[Callable[[re.Match], List[Route]]] = None, flags: int = 0):
+        self.name = name
+        self.pattern = re.compile(pattern, flags)
+        self.prefilter = tuple(prefilter)
+        self.extract = extract or (lambda m: [(m.group(1).upper(), m.group(2))])
+
+    def might_match(self, content: str) -> bool:
+        return not self.prefilter or any(token in content for token in self.prefilter)
+
+    def detect(self, content: str) -> List[Route]:
+        if not self.might_match(content):
+            return []
+        routes = []
+        for match in self.pattern.finditer(content):
+            routes.extend(self.extract(match))
+        return routes
+
+class SpringDetector(RouteDetector):
+    """
+    Spring MVC mappings. A class-level @RequestMapping path is prepended to the
+    method-level @GetMapping/@PostMapping/... paths declared after it.
+    """
+    _class_mapping = re.compile(
+        r'@RequestMapping\s*\(\s*(?:(?:value|path)\s*=\s*)?\{?\s*"([^"]*)"[^)]*\)\s*'
+        r'(?:@\w+(?:\([^)]*\))?\s*)*(?:public\s+|abstract\s+|final\s+)*class\s'
+    )
+
+    def detect(self, content: str) -> List[Route]:
+        if not self.might_match(content):
+            return []
+        class_mappings = list(self._class_mapping.finditer(content))
+        class_starts = {m.start() for m in class_mappings}
+        prefixes = [(m.end(), m.group(1).rstrip('/')) for m in class_mappings]
+        routes = []
+        for match in self.pattern.finditer(content):
+            if match.start() in class_starts:
+                continue
+            prefix = ''
+            for position, candidate in prefixes:
+                if position <= match.start():
+                    prefix = candidate
+            for method, path in self.extract(match):
+                if path and not path.startswith('/'):
+                    path = '/' + path
+                routes.append((method, (prefix + path) or '/'))
+        return routes
+
+_FLASK_METHODS = re.compile(r'methods\s*=\s*[\[\(]([^\]\)]*)')
+_SPRING_METHODS = re.compile(r'RequestMethod\.(GET|POST|PUT|DELETE|PATCH)\b')
+
+def _flask_route(match: re.Match) -> List[Route]:
+    # @app.route("/path") without methods= only answers GET
+    methods_arg = _FLASK_METHODS.search(match.group(2))
+    methods = re.findall(r'[\'"](\w+)[\'"]', methods_arg.group(1)) if methods_arg else []
+    return [(method.upper(), match.group(1)) for method in methods or ['GET']]
+
+def _go_handle_func(match: re.Match) -> List[Route]:
+    # Go 1.22 mux patterns may carry the method ("POST /items"); plain patterns accept any method
+    return [((match.group(1) or 'GET').upper(), match.group(2))]
+
+def _spring_mapping(match: re.Match) -> List[Route]:
+    kind, args = match.group(1), match.group(2) or ''
+    path_match = re.search(r'"([^"]*)"', args)
+    path = path_match.group(1) if path_match else ''
+    if kind == 'Request':
+        return [(method, path) for method in _SPRING_METHODS.findall(args) or ['GET']]
+    return [(kind.upper(), path)]
+
+# Registry: file extension -> detectors run for files with that extension
+DETECTORS: Dict[str, List[RouteDetector]] = {}
+
+def register_detector(extensions: Iterable[str], detector: RouteDetector):
+    for ext in extensions:
+        DETECTORS.setdefault(ext.lower(), []).append(detector)
+
+def detectors_for(filename: str) -> List[RouteDetector]:
+    return DETECTORS.get(os.path.splitext(filename)[1].lower(), [])
+
+def detect_routes(content: str, filename: str) -> List[Route]:
+    routes = []
+    for detector in detectors_for(filename):
+        routes.extend(detector.detect(content))
+    return routes
+
+# --- Built-in detectors ---
+
+JS_EXTENSIONS = ['.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs']
+
+# Express: app.get('/path', ...), router.post('/path', ...), userRouter.put(`/path`, ...)
+register_detector(JS_EXTENSIONS, RouteDetector(
+    "express",
+    r'(?:app|router|App|Router)\.(get|post|put|delete|patch)\s*\(\s*[\'"`]([^\'"`]+)[\'"`]',
+    prefilter=("app.", "router.", "App.", "Router."),
+))
+
+# FastAPI apps and APIRouters: @app.get("/path"), @router.post("/path")
+# (no space before the parenthesis, so every match contains one of the prefilter tokens)
+register_detector(['.py'], RouteDetector(
+    "fastapi",
+    r'@\w+\.(get|post|put|delete|patch)\(\s*[\'"]([^\'"]+)[\'"]',
+    prefilter=tuple(f".{m.lower()}(" for m in HTTP_METHODS),
+))
+
+# Flask / FastAPI generic routes: @app.route("/path", methods=["GET", "POST"]), @router.api_route(...)
+register_detector(['.py'], RouteDetector(
+    "flask",
+    r'@\w+\.(?:route|api_route)\(\s*[\'"]([^\'"]+)[\'"]([^)]*)\)',
+    prefilter=(".route(", ".api_route("),
+    extract=_flask_route,
+))
+
+# net/http: http.HandleFunc("/path", h), mux.Handle("POST /items", h)
+register_detector(['.go'], RouteDetector(
+    "go-net-http",
+    r'\.Handle(?:Func)?\(\s*"(?:(GET|POST|PUT|DELETE|PATCH)\s+)?(/[^"]*)"',
+    prefilter=(".HandleFunc(", ".Handle("),
+    extract=_go_handle_func,
+))
+
+# Gin / Echo / Chi style routers: r.GET("/path", h)
+register_detector(['.go'], RouteDetector(
+    "go-router",
+    r'\b\w+\.(GET|POST|PUT|DELETE|PATCH|Get|Post|Put|Delete|Patch)\(\s*"(/[^"]*)"',
+    prefilter=tuple(f".{m}(" for m in HTTP_METHODS + ('Get', 'Post', 'Put', 'Delete', 'Patch')),
+))
+
+# Spring: @GetMapping("/path"), @RequestMapping(value = "/path", method = RequestMethod.POST)
+register_detector(['.java'], SpringDetector(
+    "spring",
+    r'@(Get|Post|Put|Delete|Patch|Request)Mapping\b(?:\s*\(([^)]*)\))?',
+    prefilter=("Mapping",),
+    extract=_spring_mapping,
+))
@@ -1,120 +1,551 @@
 import os
 import zipfile
-import re
 import shutil
-from typing import List, Dict, Any
+import json
+import zlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple, Callable, Union
+from .route_detectors import detect_routes, detectors_for
+from .ignore_rules import ScanFilter, looks_binary
+
+# Parallel scan settings. Small projects are scanned in-process because shipping
+# their files to the pool costs more than it saves.
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", str(min(4, os.cpu_count() or 1))))
+SCAN_CHUNK_SIZE = int(os.getenv("SCAN_CHUNK_SIZE", "250"))
+SCAN_PARALLEL_MIN_FILES = int(os.getenv("SCAN_PARALLEL_MIN_FILES", "2000"))
+
+# Extraction limits, so one oversized or highly compressed upload can't fill the
+# session disk or tie up a worker
+ZIP_MAX_TOTAL_BYTES = int(os.getenv("ZIP_MAX_TOTAL_BYTES", str(1024 * 1024 * 1024)))
+ZIP_MAX_ENTRIES = int(os.getenv("ZIP_MAX_ENTRIES", "100000"))
+ZIP_MAX_RATIO = float(os.getenv("ZIP_MAX_RATIO", "100"))
+# Members smaller than this are never rejected for their ratio: repetitive source
+# files compress far beyond ZIP_MAX_RATIO, and small ones can't fill the disk anyway
+ZIP_RATIO_MIN_BYTES = int(os.getenv("ZIP_RATIO_MIN_BYTES", str(1024 * 1024)))
+ZIP_COPY_CHUNK_BYTES = 64 * 1024
+
+# Bump whenever detection logic or the endpoint format changes so stale scan indexes are discarded
+SCAN_INDEX_VERSION = 3
+
+# A scanned file: (archive-relative path, content hash, endpoints), where endpoints
+# is None if the file is unchanged, or a str saying why it couldn't be scanned
+FileResult = Tuple[str, str, Union[List[Dict[str, Any]], str, None]]
+
+# Called as progress_callback(stage, done, total)
+ProgressCallback = Callable[[str, int, int], None]
+
+class ZipLimitError(ValueError):
+    """Raised when an archive exceeds the configured entry, size or ratio limits."""
+    pass
+
+# The archive a pool process last read from, kept open for the scan's next chunks
+_worker_zip: Optional[Tuple[tuple, zipfile.ZipFile]] = None
+
+def _open_worker_zip(zip_file_path: str) -> zipfile.ZipFile:
+    global _worker_zip
+    st = os.stat(zip_file_path)
+    key = (zip_file_path, st.st_ino, st.st_size, st.st_mtime_ns)
+    if _worker_zip is None or _worker_zip[0] != key:
+        if _worker_zip is not None:
+            _worker_zip[1].close()
+        _worker_zip = (key, zipfile.ZipFile(zip_file_path, 'r'))
+    return _worker_zip[1]
+
+def _scan_zip_chunk(zip_file_path: str, members: List[Tuple[str, str]]) -> List[FileResult]:
+    return ProjectScanner(workers=1)._scan_zip_members(_open_worker_zip(zip_file_path), members)
+
+def _scan_file_chunk(project_root: str, known_hashes: Dict[str, str], rel_paths: List[str]) -> List[FileResult]:
+    return ProjectScanner(workers=1)._scan_files(project_root, rel_paths, known_hashes)
 
 class ProjectScanner:
-    def __init__(self):
+    def __init__(self, workers: Optional[int] = None, chunk_size: Optional[int] = None,
+                 parallel_min_files: Optional[int] = None, ignored_dirs: Optional[List[str]] = None,
+                 max_file_bytes: Optional[int] = None):
         # Directories are now handled per-request
-        pass
+        self.ignored_dirs = ignored_dirs
+        self.max_file_bytes = max_file_bytes
+        self.workers = max(1, workers if workers is not None else SCAN_WORKERS)
+        self.chunk_size = max(1, chunk_size or SCAN_CHUNK_SIZE)
+        self.parallel_min_files = SCAN_PARALLEL_MIN_FILES if parallel_min_files is None else parallel_min_files
+        self.max_total_bytes = ZIP_MAX_TOTAL_BYTES
+        self.max_entries = ZIP_MAX_ENTRIES
+        self.max_ratio = ZIP_MAX_RATIO
+        self.ratio_min_bytes = ZIP_RATIO_MIN_BYTES
+        # One long-lived pool shared by every scan (see start)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
 
-    def extract_zip(self, zip_path: str, extract_dir: str) -> str:
+    def start(self) -> ProcessPoolExecutor:
+        """
+        Creates the worker pool, if it doesn't exist yet. Its processes start on
+        the first parallel scan and are reused by later ones. They come from a
+        fork server (or are spawned), never forked from the threaded server
+        process itself.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _check_archive(self, infos: List[zipfile.ZipInfo]):
+        """
+        Cheap pre-flight on the central directory: rejects archives with too many
+        entries or a declared size above the budget before anything is written.
+        """
+        if len(infos) > self.max_entries:
+            raise ZipLimitError(f"Archive has {len(infos)} entries (limit {self.max_entries})")
+        declared = sum(info.file_size for info in infos)
+        if declared > self.max_total_bytes:
+            raise ZipLimitError(f"Archive expands to {declared} bytes (limit {self.max_total_bytes})")
+
+    def _check_ratio(self, info: zipfile.ZipInfo):
+        if info.file_size > self.ratio_min_bytes and info.compress_size and info.file_size / info.compress_size > self.max_ratio:
+            raise ZipLimitError(
+                f"{info.filename} has compression ratio {info.file_size / info.compress_size:.0f}:1 (limit {self.max_ratio:.0f}:1)"
+            )
+
+    def _copy_member(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, target: str, budget: int) -> int:
+        """
+        Streams one member to disk in chunks, aborting as soon as more than `budget`
+        bytes have been written. Returns the number of bytes written.
+        """
+        self._check_ratio(info)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        written = 0
+        with zip_ref.open(info) as src, open(target, 'wb') as dst:
+            while True:
+                chunk = src.read(ZIP_COPY_CHUNK_BYTES)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > budget:
+                    raise ZipLimitError(f"Extraction exceeded the {self.max_total_bytes} byte budget at {info.filename}")
+                dst.write(chunk)
+        return written
+
+    def extract_zip(self, zip_path: str, extract_dir: str, progress_callback: Optional[ProgressCallback] = None,
+                    root_name: Optional[str] = None) -> str:
         """
         Extracts the uploaded zip file to the specified extraction directory.
+        Members are streamed one at a time against the byte budget, entry cap and
+        compression ratio limit; a violation aborts and removes the partial tree.
         Returns the path to the extracted folder.
         """
         if not os.path.exists(zip_path):
             raise FileNotFoundError(f"Zip file not found: {zip_path}")
             
-        project_name = os.path.basename(zip_path).replace(".zip", "")
-        target_path = os.path.join(extract_dir, project_name)
+        target_path = self.project_root(zip_path, extract_dir, root_name)
         
         # Clean up if exists (though main.py handles this too, double safety)
         if os.path.exists(target_path):
             shutil.rmtree(target_path)
         os.makedirs(target_path, exist_ok=True)
             
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(target_path)
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                infos = zip_ref.infolist()
+                self._check_archive(infos)
+
+                written = 0
+                for i, info in enumerate(infos):
+                    target = self._member_path(target_path, info.filename)
+                    if info.is_dir():
+                        os.makedirs(target, exist_ok=True)
+                    else:
+                        written += self._copy_member(zip_ref, info, target, self.max_total_bytes - written)
+                    if progress_callback:
+                        progress_callback("extract", i + 1, len(infos))
+        except Exception:
+            shutil.rmtree(target_path, ignore_errors=True)
+            raise
             
         return target_path
 
+    def project_root(self, zip_path: str, extract_dir: str, root_name: Optional[str] = None) -> str:
+        """
+        Returns the folder the archive is (or would be) extracted to: named after
+        the archive, unless `root_name` says otherwise (e.g. for a tree shared by
+        several uploads of the same archive under different names).
+        """
+        project_name = root_name or os.path.basename(zip_path).replace(".zip", "")
+        return os.path.join(extract_dir, project_name)
+
+    def _member_path(self, project_root: str, member_name: str) -> str:
+        """
+        Maps a ZIP member name onto its location inside the extracted project,
+        refusing names that would escape the project folder (zip-slip).
+        """
+        target = os.path.normpath(os.path.join(project_root, *member_name.split('/')))
+        root = os.path.normpath(project_root)
+        if os.path.commonpath([root, target]) != root:
+            raise ValueError(f"Unsafe path in archive: {member_name}")
+        return target
+
+    def _new_filter(self) -> ScanFilter:
+        return ScanFilter(self.ignored_dirs, self.max_file_bytes)
+
+    def _zip_filter(self, zip_ref: zipfile.ZipFile) -> ScanFilter:
+        """
+        Builds the filter for an archive, loading every .gitignore it contains
+        (outermost first so nested rules take precedence).
+        """
+        scan_filter = self._new_filter()
+        gitignores = [
+            info for info in zip_ref.infolist()
+            if os.path.basename(info.filename) == '.gitignore' and info.file_size <= scan_filter.max_file_bytes
+        ]
+        for info in sorted(gitignores, key=lambda i: i.filename.count('/')):
+            if scan_filter.is_ignored_file(info.filename):
+                continue
+            text = zip_ref.read(info).decode('utf-8', errors='ignore')
+            scan_filter.gitignore.add_file(text, base=os.path.dirname(info.filename))
+        return scan_filter
+
+    def _zip_candidates(self, zip_ref: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+        """Backend source members that pass the ignore rules, in archive order."""
+        scan_filter = self._zip_filter(zip_ref)
+        return [
+            info for info in zip_ref.infolist()
+            if not info.is_dir()
+            and self._is_backend_file(info.filename)
+            and not scan_filter.is_ignored_file(info.filename, info.file_size)
+        ]
+
     def _is_backend_file(self, filename: str) -> bool:
-        valid_extensions = ['.js', '.jsx', '.ts', '.tsx', '.py', '.go', '.java']
-        return any(filename.endswith(ext) for ext in valid_extensions)
+        return bool(detectors_for(filename))
 
     def analyze_file_static(self, file_content: str, filename: str) -> List[Dict[str, Any]]:
         """
-        Uses Regex to parse the code and extract API endpoint metadata.
+        Runs the route detectors registered for the file's extension (see
+        route_detectors.py) and returns API endpoint metadata.
         """
         endpoints = []
-        
-        # Regex patterns for Express.js
-        # Matches: app.get('/path', ...), router.post('/path', ...)
-        pattern = re.compile(r'(app|router)\.(get|post|put|delete|patch)\s*\(\s*[\'"]([^\'"]+)[\'"]', re.IGNORECASE)
-        
-        matches = pattern.findall(file_content)
-        
-        for match in matches:
-            _, method, path = match
-            method = method.upper()
-            
-            endpoints.append({
-                "path": path,
-                "method": method,
-                "description": f"Detected {method} endpoint at {path}",
-                "payload_schema": {} 
-            })
-            
-        # Regex for FastAPI/Flask (Python)
-        # @app.get("/path") or @app.route("/path", methods=["GET"])
-        python_pattern = re.compile(r'@app\.(get|post|put|delete|patch)\s*\(\s*[\'"]([^\'"]+)[\'"]', re.IGNORECASE)
-        py_matches = python_pattern.findall(file_content)
-        for match in py_matches:
-            method, path = match
-            method = method.upper()
+        for method, path in detect_routes(file_content, filename):
             endpoints.append({
                 "path": path,
                 "method": method,
                 "description": f"Detected {method} endpoint at {path}",
                 "payload_schema": {}
             })
-
         return endpoints
 
-    def scan_project(self, zip_file_path: str, extract_dir: str) -> List[Dict[str, Any]]:
+    def _scan_zip_members(self, zip_ref: zipfile.ZipFile, members: List[Tuple[str, str]]) -> List[FileResult]:
+        results = []
+        for name, content_hash in members:
+            try:
+                self._check_ratio(zip_ref.getinfo(name))
+                raw = zip_ref.read(name)
+                if looks_binary(raw):
+                    results.append((name, content_hash, []))
+                    continue
+                content = raw.decode('utf-8', errors='ignore')
+                results.append((name, content_hash, self.analyze_file_static(content, os.path.basename(name))))
+            except Exception as e:
+                print(f"[Scanner] Could not read {name}: {e}")
+                results.append((name, content_hash, str(e)))
+        return results
+
+    def _scan_files(self, project_root: str, rel_paths: List[str], known_hashes: Dict[str, str]) -> List[FileResult]:
+        """
+        Reads and hashes each file. Files whose hash matches `known_hashes` are
+        reported as unchanged (endpoints None) without running the detectors.
+        """
+        results = []
+        for rel_path in rel_paths:
+            file_path = os.path.join(project_root, *rel_path.split('/'))
+            try:
+                with open(file_path, 'rb') as f:
+                    raw = f.read()
+
+                # Same form as the archive's CRC entries, so both scan modes share an index
+                content_hash = f"crc32:{zlib.crc32(raw):08x}:{len(raw)}"
+                if known_hashes.get(rel_path) == content_hash:
+                    results.append((rel_path, content_hash, None))
+                    continue
+                if looks_binary(raw):
+                    results.append((rel_path, content_hash, []))
+                    continue
+
+                content = raw.decode('utf-8', errors='ignore')
+                results.append((rel_path, content_hash, self.analyze_file_static(content, os.path.basename(file_path))))
+
+            except Exception as e:
+                print(f"[Scanner] Could not read {file_path}: {e}")
+                results.append((rel_path, "", str(e)))
+        return results
+
+    def _use_pool(self, file_count: int) -> bool:
+        return self.workers > 1 and file_count >= self.parallel_min_files
+
+    def _run_chunks(self, items: list, serial_func, pool_func,
+                    progress_callback: Optional[ProgressCallback] = None) -> List[FileResult]:
+        """
+        Analyzes `items` in fixed-size chunks, in-process or spread over the process
+        pool. There are many more chunks than workers so idle processes keep pulling
+        work, and results are merged in chunk order so the output is identical to a
+        serial scan. Progress is reported after every chunk.
+        """
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        results = []
+        done = 0
+        if self._use_pool(len(items)):
+            print(f"[Scanner] Scanning {len(items)} files with {self.workers} workers...")
+            pool = self.start()
+            finished = 0
+            try:
+                for chunk, chunk_results in zip(chunks, pool.map(pool_func, chunks)):
+                    results.extend(chunk_results)
+                    finished += 1
+                    done += len(chunk)
+                    if progress_callback:
+                        progress_callback("scan", done, len(items))
+                return results
+            except BrokenProcessPool as e:
+                # A worker died (e.g. killed for memory): drop the pool so the next
+                # scan gets a fresh one, and finish this one in-process
+                print(f"[Scanner] Worker pool broke ({e}); finishing the scan in-process.")
+                with self._pool_lock:
+                    if self._pool is pool:
+                        self._pool = None
+                chunks = chunks[finished:]
+        for chunk in chunks:
+            results.extend(serial_func(chunk))
+            done += len(chunk)
+            if progress_callback:
+                progress_callback("scan", done, len(items))
+        return results
+
+    def load_index(self, index_path: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Loads a scan index: { "relative/path.js": { "hash": ..., "endpoints": [...] } }
+        Returns an empty index if the file is missing, unreadable or outdated.
+        """
+        if not index_path or not os.path.exists(index_path):
+            return {}
+        try:
+            with open(index_path, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == SCAN_INDEX_VERSION:
+                return data.get("files", {})
+        except Exception as e:
+            print(f"[Scanner] Ignoring unreadable scan index {index_path}: {e}")
+        return {}
+
+    def save_index(self, index_path: str, files: Dict[str, Dict[str, Any]]):
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": SCAN_INDEX_VERSION, "files": files}, f)
+        os.replace(tmp_path, index_path)
+
+    def _merge_results(self, keys: List[str], attempted: set, results: List[FileResult],
+                       index: Dict[str, Dict[str, Any]], index_path: Optional[str],
+                       project_root: str, skipped: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, Any]]:
+        """
+        Folds fresh results into the index, drops deleted (or now unreadable) files,
+        and assembles the endpoint list in `keys` order with `source_file` pointing
+        into `project_root`. `attempted` holds the keys that were handed to analysis.
+        Files that couldn't be scanned are appended to `skipped` as {"file", "reason"}.
+        """
+        changed = 0
+        new_index = {}
+        for key in keys:
+            if key in index and key not in attempted:
+                new_index[key] = index[key]
+        for key, content_hash, endpoints in results:
+            if isinstance(endpoints, str):
+                # Left out of the index, so the next scan tries again
+                if skipped is not None:
+                    skipped.append({"file": key, "reason": endpoints})
+            elif endpoints is None:
+                new_index[key] = index[key]
+            else:
+                new_index[key] = {"hash": content_hash, "endpoints": endpoints}
+                changed += 1
+
+        removed = len(set(index) - set(new_index))
+        if index_path and (changed or removed or not os.path.exists(index_path)):
+            self.save_index(index_path, new_index)
+
+        all_endpoints = []
+        for key in keys:
+            entry = new_index.get(key)
+            if not entry or not entry["endpoints"]:
+                continue
+            # Tag the source file for debugging/healing later, and its project-relative
+            # path and content hash so test generation can tell which routes changed
+            file_path = self._member_path(project_root, key)
+            all_endpoints.extend(
+                {**ep, 'source_file': file_path, 'source_path': key, 'source_hash': entry["hash"]}
+                for ep in entry["endpoints"]
+            )
+
+        reused = len(keys) - changed
+        print(f"[Scanner] Analyzed {changed} changed files, reused {reused} unchanged, dropped {removed} deleted.")
+        return all_endpoints
+
+    def scan_zip_in_place(self, zip_file_path: str, extract_dir: str, index_path: Optional[str] = None,
+                          progress_callback: Optional[ProgressCallback] = None,
+                          root_name: Optional[str] = None,
+                          skipped: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, Any]]:
+        """
+        Scans the archive without extracting it. Entries are filtered by path and
+        extension using the central directory only, so ignored folders and assets
+        are never decompressed. Endpoints are tagged with the path the source file
+        will have once it is extracted with `ensure_extracted`.
+
+        With an `index_path`, members whose CRC and size match the previous scan are
+        not decompressed at all; their endpoints come from the index. The members
+        that are decompressed may add up to at most the extraction byte budget.
+        """
+        if not os.path.exists(zip_file_path):
+            raise FileNotFoundError(f"Zip file not found: {zip_file_path}")
+
+        project_root = self.project_root(zip_file_path, extract_dir, root_name)
+        index = self.load_index(index_path)
+
+        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+            entry_count = len(zip_ref.infolist())
+            if entry_count > self.max_entries:
+                raise ZipLimitError(f"Archive has {entry_count} entries (limit {self.max_entries})")
+            members = [(info.filename, f"crc32:{info.CRC:08x}:{info.file_size}") for info in self._zip_candidates(zip_ref)]
+            changed = [(name, h) for name, h in members if index.get(name, {}).get("hash") != h]
+            # Reads stop at each member's declared size, so the declared total bounds the work
+            to_read = sum(zip_ref.getinfo(name).file_size for name, _ in changed)
+            if to_read > self.max_total_bytes:
+                raise ZipLimitError(f"Source files expand to {to_read} bytes (limit {self.max_total_bytes})")
+
+            results = self._run_chunks(
+                changed, partial(self._scan_zip_members, zip_ref), partial(_scan_zip_chunk, zip_file_path),
+                progress_callback=progress_callback
+            )
+
+        all_endpoints = self._merge_results(
+            [name for name, _ in members], {name for name, _ in changed}, results, index, index_path, project_root,
+            skipped
+        )
+        print(f"[Scanner] In-place scan complete. Scanned {len(members)} files. Found {len(all_endpoints)} total endpoints.")
+        return all_endpoints
+
+    def ensure_extracted(self, zip_file_path: str, extract_dir: str, file_path: str,
+                         root_name: Optional[str] = None) -> Optional[str]:
         """
-        Orchestrates the scanning process: extracts zip, walks files, detects endpoints.
+        Lazily extracts a single file from the archive if it is not on disk yet.
+        `file_path` is the location reported in an endpoint's `source_file`.
+        Returns the path on disk, or None if the archive has no such member.
+        """
+        if os.path.exists(file_path):
+            return file_path
+
+        project_root = os.path.normpath(self.project_root(zip_file_path, extract_dir, root_name))
+        target = os.path.normpath(file_path)
+        if os.path.commonpath([project_root, target]) != project_root:
+            return None
+        member_name = os.path.relpath(target, project_root).replace(os.sep, '/')
+
+        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+            try:
+                info = zip_ref.getinfo(member_name)
+            except KeyError:
+                return None
+            # Write beside the target and rename, so concurrent sessions sharing
+            # an extracted tree never see a half-written file
+            tmp_target = f"{target}.{os.getpid()}.{threading.get_ident()}.part"
+            try:
+                self._copy_member(zip_ref, info, tmp_target, self.max_total_bytes)
+                os.replace(tmp_target, target)
+            finally:
+                if os.path.exists(tmp_target):
+                    os.remove(tmp_target)
+
+        print(f"[Scanner] Lazily extracted {member_name}")
+        return target
+
+    def list_backend_files(self, zip_file_path: str, extract_dir: str, root_name: Optional[str] = None) -> List[str]:
+        """
+        Lists the would-be extracted paths of all backend source files in the archive.
+        """
+        project_root = self.project_root(zip_file_path, extract_dir, root_name)
+        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
+            return [self._member_path(project_root, info.filename) for info in self._zip_candidates(zip_ref)]
+
+    def scan_project(self, zip_file_path: str, extract_dir: str, in_place: bool = True,
+                     index_path: Optional[str] = None,
+                     progress_callback: Optional[ProgressCallback] = None,
+                     root_name: Optional[str] = None,
+                     skipped: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, Any]]:
+        """
+        Orchestrates the scanning process: detects endpoints either straight from the
+        archive (default) or by extracting the zip and walking the files.
+
+        `index_path` enables incremental rescans: only added or changed files are
+        analyzed, and endpoints of deleted files are dropped. `progress_callback`
+        receives ("extract", done, total) and ("scan", done, total) updates.
+        `root_name` is passed on to project_root. Files that couldn't be read are
+        appended to `skipped` as {"file", "reason"} instead of failing the scan.
         """
         print(f"[Scanner] Starting scan for {zip_file_path}...")
+
+        if in_place:
+            return self.scan_zip_in_place(zip_file_path, extract_dir, index_path, progress_callback, root_name, skipped)
         
         try:
-            extracted_path = self.extract_zip(zip_file_path, extract_dir)
+            extracted_path = self.extract_zip(zip_file_path, extract_dir, progress_callback, root_name)
         except Exception as e:
             print(f"[Scanner] Extraction failed: {e}")
             raise e
 
-        all_endpoints = []
-        files_scanned = 0
-        
+        rel_paths = []
+        scan_filter = self._new_filter()
         for root, dirs, files in os.walk(extracted_path):
-            # Skip node_modules and hidden dirs
-            if 'node_modules' in root or '.git' in root:
-                continue
+            rel_root = os.path.relpath(root, extracted_path).replace(os.sep, '/')
+            rel_root = '' if rel_root == '.' else rel_root
+
+            if '.gitignore' in files:
+                try:
+                    with open(os.path.join(root, '.gitignore'), 'r', encoding='utf-8', errors='ignore') as f:
+                        scan_filter.gitignore.add_file(f.read(), base=rel_root)
+                except OSError as e:
+                    print(f"[Scanner] Could not read .gitignore in {root}: {e}")
+
+            # Prune ignored folders in place so os.walk never descends into them,
+            # and walk in sorted order so endpoint lists are stable between runs
+            dirs[:] = sorted(d for d in dirs if not scan_filter.is_ignored_dir(f"{rel_root}/{d}".lstrip('/')))
                 
-            for file in files:
-                if self._is_backend_file(file):
-                    file_path = os.path.join(root, file)
-                    # print(f"[Scanner] Visiting file: {file_path}")
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                            
-                        files_scanned += 1
-                        endpoints = self.analyze_file_static(content, file)
-                        
-                        if endpoints:
-                            # Tag the source file for debugging/healing later
-                            for ep in endpoints:
-                                ep['source_file'] = file_path
-                            all_endpoints.extend(endpoints)
-                            
-                    except Exception as e:
-                        print(f"[Scanner] Could not read {file}: {e}")
-
-        print(f"[Scanner] Scan complete. Scanned {files_scanned} files. Found {len(all_endpoints)} total endpoints.")
+            for file in sorted(files):
+                if not self._is_backend_file(file):
+                    continue
+                rel_path = f"{rel_root}/{file}".lstrip('/')
+                try:
+                    size = os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    continue
+                if not scan_filter.is_ignored_file(rel_path, size):
+                    rel_paths.append(rel_path)
+
+        index = self.load_index(index_path)
+        known_hashes = {key: entry["hash"] for key, entry in index.items()}
+
+        results = self._run_chunks(
+            rel_paths, lambda chunk: self._scan_files(extracted_path, chunk, known_hashes),
+            partial(_scan_file_chunk, extracted_path, known_hashes), progress_callback=progress_callback
+        )
+
+        all_endpoints = self._merge_results(rel_paths, set(rel_paths), results, index, index_path, extracted_path,
+                                            skipped)
+        print(f"[Scanner] Scan complete. Scanned {len(results)} files. Found {len(all_endpoints)} total endpoints.")
         return all_endpoints
 
 if __name__ == "__main__":
@@ -0,0 +1,173 @@
+import re
+import ast
+from typing import List, Tuple, Dict, Set, Optional, Any
+
+SHARED_FIXTURES = {"base_url"}
+# Each part of a merged suite starts with a "# --- section: <label> ---" line
+SECTION_MARKER = re.compile(r"^# --- section: (.+) ---$", re.M)
+
+def _node_source(code: str, lines: List[str], node: ast.stmt) -> str:
+    """Original text of a top-level statement, with its decorators and leading comments."""
+    start = min([d.lineno for d in getattr(node, "decorator_list", [])] + [node.lineno])
+    # Keep the comment block directly above it
+    while start > 1 and lines[start - 2].strip().startswith("#"):
+        start -= 1
+    return "\n".join(lines[start - 1:node.end_lineno])
+
+def _defined_names(node: ast.stmt) -> List[str]:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return [node.name]
+    if isinstance(node, ast.Assign):
+        return [t.id for t in node.targets if isinstance(t, ast.Name)]
+    if isinstance(node, (ast.AnnAssign, ast.AugAssign)) and isinstance(node.target, ast.Name):
+        return [node.target.id]
+    return []
+
+def _module_names(code: str) -> Tuple[Set[str], List[ast.stmt]]:
+    """Names defined at module level and the import statements, for code that may not parse."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set(), []
+    names = {name for node in tree.body for name in _defined_names(node)}
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return names, imports
+
+def _is_main_guard(node: ast.stmt) -> bool:
+    return (isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+            and isinstance(node.test.left, ast.Name) and node.test.left.id == "__name__")
+
+class _Renamer(ast.NodeTransformer):
+    """Renames module-level names everywhere they are used, including fixture parameters."""
+    def __init__(self, renames: Dict[str, str]):
+        self.renames = renames
+
+    def visit_Name(self, node: ast.Name):
+        node.id = self.renames.get(node.id, node.id)
+        return node
+
+    def visit_arg(self, node: ast.arg):
+        node.arg = self.renames.get(node.arg, node.arg)
+        return node
+
+    def _rename_def(self, node):
+        node.name = self.renames.get(node.name, node.name)
+        self.generic_visit(node)
+        return node
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _rename_def
+
+def shared_fixture_source(base_url: str) -> str:
+    return (
+        "@pytest.fixture(scope=\"session\")\n"
+        "def base_url():\n"
+        "    \"\"\"Base URL of the API under test (shared by every generated batch).\"\"\"\n"
+        f"    return {base_url!r}\n"
+    )
+
+def split_suite(code: str, labels: Optional[Set[str]] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Splits a merged suite into its header (imports and shared fixtures) and the
+    body of each labelled section, exactly as they appear in the file. With
+    `labels`, marker-like lines for any other label stay part of the body.
+    """
+    matches = [m for m in SECTION_MARKER.finditer(code) if labels is None or m.group(1) in labels]
+    if not matches:
+        return code.rstrip("\n"), {}
+    sections = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(code)
+        sections[match.group(1)] = code[match.end():end].strip("\n")
+    return code[:matches[0].start()].rstrip("\n"), sections
+
+def _add_imports(header: str, new_imports: List[str]) -> str:
+    """Inserts imports after the last import of an existing header."""
+    if not new_imports:
+        return header
+    _, imports = _module_names(header)
+    lines = header.split("\n")
+    at = max((node.end_lineno for node in imports), default=0)
+    return "\n".join(lines[:at] + new_imports + lines[at:])
+
+def merge_test_modules(parts: List[Dict[str, Any]], base_url: str, header: Optional[str] = None) -> str:
+    """
+    Merges independently generated pytest modules into one suite.
+
+    Each part is a dict with a `label` and one of:
+    - `code`: a generated module. Its imports are deduplicated and hoisted, its
+      own `base_url` fixture is dropped in favour of one shared fixture, and
+      module-level names that clash with another part are renamed (with all
+      references in that part). The part keeps its original text unless
+      something in it had to be renamed.
+    - `code` with `verbatim=True`: the body of a section kept from an earlier
+      suite, copied byte for byte.
+    - `error`: a part whose generation failed, recorded as a comment.
+
+    `header` replaces the generated imports and shared fixture, e.g. to keep the
+    header of an existing suite unchanged; missing imports are added to it.
+    """
+    header_names, header_imports = _module_names(header or "")
+    seen_imports: Set[str] = {"import pytest"} | {ast.unparse(node) for node in header_imports}
+    imports: List[str] = []
+    defined: Set[str] = set(SHARED_FIXTURES) | header_names
+    # Sections kept verbatim can't be renamed, so their names are claimed first
+    for part in parts:
+        if part.get("verbatim"):
+            defined |= _module_names(part["code"])[0]
+
+    sections: List[Tuple[str, str]] = []
+    for part in parts:
+        label = part["label"]
+        if part.get("error"):
+            sections.append((label, f"# Generation failed: {part['error']}"))
+            continue
+        if part.get("verbatim"):
+            sections.append((label, part["code"]))
+            continue
+
+        code = part["code"]
+        tree = ast.parse(code)
+        lines = code.splitlines()
+        body = []
+        renames: Dict[str, str] = {}
+        seen_here: Set[str] = set()
+        for node in tree.body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                text = ast.unparse(node)
+                if text not in seen_imports:
+                    seen_imports.add(text)
+                    imports.append(text)
+                continue
+            if _is_main_guard(node):
+                continue
+            names = _defined_names(node)
+            if any(name in SHARED_FIXTURES for name in names):
+                continue
+            for name in names:
+                if name in defined and name not in seen_here and name not in renames:
+                    suffix = 2
+                    while f"{name}_{suffix}" in defined:
+                        suffix += 1
+                    renames[name] = f"{name}_{suffix}"
+            seen_here.update(names)
+            body.append(node)
+
+        # Renamed names can only be resolved once the whole part has been seen
+        if renames:
+            renamer = _Renamer(renames)
+            chunks = [ast.unparse(renamer.visit(node)) for node in body]
+        else:
+            chunks = [_node_source(code, lines, node) for node in body]
+        for node in body:
+            defined.update(_defined_names(node))
+
+        if chunks:
+            sections.append((label, "\n\n".join(chunks)))
+
+    if header is None:
+        out = "\n".join(["import pytest"] + imports) + "\n\n\n" + shared_fixture_source(base_url).rstrip("\n")
+    else:
+        out = _add_imports(header, imports)
+    for label, body in sections:
+        out += f"\n\n\n# --- section: {label} ---\n\n{body}"
+    return out + "\n"
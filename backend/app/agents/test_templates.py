@@ -0,0 +1,99 @@
+import os
+import re
+from typing import List, Dict, Any
+
+# Which endpoints get template tests instead of an LLM call:
+#   auto   - trivial routes only (health checks, GET/HEAD without path parameters or payload)
+#   always - every endpoint (no LLM calls at all)
+#   never  - no templates (every endpoint goes to the LLM)
+TEMPLATE_POLICY = os.getenv("TEMPLATE_POLICY", "auto").lower()
+
+_HEALTH_PATH = re.compile(r"/(health|healthz|ping|status|ready|readyz|live|livez|version|metrics)/?$", re.I)
+# Reads the template can call as they are; anything that changes data or needs a
+# real ID (DELETE, /users/:id) can't be tested meaningfully without knowing the app
+_TRIVIAL_METHODS = {"GET", "HEAD"}
+# :id (Express), {id} (FastAPI/Spring/Go), <int:id> (Flask), trailing * (wildcards)
+_PATH_PARAM = re.compile(r":(\w+)\??|\{(\w+)(?::[^}]*)?\}|<(?:(\w+):)?(\w+)>|\*")
+
+_SAMPLE_VALUES = {
+    "string": "test_string", "str": "test_string", "text": "test_string",
+    "number": 1, "integer": 1, "int": 1, "float": 1.5,
+    "boolean": True, "bool": True,
+    "array": [], "list": [],
+    "object": {}, "dict": {},
+}
+
+def use_template(ep: Dict[str, Any], policy: str = None) -> bool:
+    """The routing decision for one endpoint."""
+    policy = (policy or TEMPLATE_POLICY).lower()
+    if policy == "always":
+        return True
+    if policy == "never":
+        return False
+    method = (ep.get("method") or "GET").upper()
+    if _HEALTH_PATH.search(ep.get("path") or "") and method == "GET":
+        return True
+    return (method in _TRIVIAL_METHODS and not ep.get("payload_schema")
+            and not _PATH_PARAM.search(ep.get("path") or ""))
+
+def _param_value(name: str, converter: str = None) -> str:
+    if converter in ("int", "float") or name.lower() == "id" or name.lower().endswith("id"):
+        return "1"
+    return "test"
+
+def concrete_path(path: str) -> str:
+    """Replaces path parameters with sample values: /users/:id -> /users/1."""
+    def replace(match):
+        if match.group(0) == "*":
+            return "test"
+        name = match.group(1) or match.group(2) or match.group(4)
+        return _param_value(name, match.group(3))
+    return _PATH_PARAM.sub(replace, path or "/")
+
+def sample_payload(schema: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {}
+    for key, kind in (schema or {}).items():
+        if isinstance(kind, dict):
+            payload[key] = sample_payload(kind)
+        else:
+            payload[key] = _SAMPLE_VALUES.get(str(kind).lower(), "test_string")
+    return payload
+
+def _test_name(method: str, path: str) -> str:
+    slug = re.sub(r"[^0-9a-zA-Z]+", "_", re.sub(_PATH_PARAM, lambda m: "by_" + (m.group(1) or m.group(2) or m.group(4) or "any"), path or "/")).strip("_").lower()
+    return f"test_{method.lower()}_{slug or 'root'}"
+
+def render_test_function(ep: Dict[str, Any]) -> str:
+    method = (ep.get("method") or "GET").upper()
+    path = ep.get("path") or "/"
+    url_path = concrete_path(path)
+    call = f"requests.request({method!r}, f\"{{base_url}}{url_path}\", timeout=10"
+    if method in ("POST", "PUT", "PATCH"):
+        call += f", json={sample_payload(ep.get('payload_schema'))!r}"
+    call += ")"
+
+    if _HEALTH_PATH.search(path) and method == "GET":
+        check = ("    assert response.status_code == 200, "
+                 "f\"Expected 200 but got {response.status_code}. Response: {response.text}\"")
+    else:
+        # Without knowing auth or fixtures, the one safe expectation is that the server doesn't crash
+        check = ("    assert response.status_code < 500, "
+                 "f\"Server error {response.status_code}. Response: {response.text}\"")
+    return (
+        f"def {_test_name(method, path)}(base_url):\n"
+        f"    \"\"\"{method} {path} (template)\"\"\"\n"
+        f"    response = {call}\n"
+        f"{check}\n"
+    )
+
+def render_test_module(endpoints: List[Dict[str, Any]]) -> str:
+    """A pytest module for `endpoints`, in the same shape the LLM is asked to produce."""
+    functions = []
+    seen = set()
+    for ep in endpoints:
+        code = render_test_function(ep)
+        # Same method and path listed twice (e.g. two detectors) -> one test
+        if code not in seen:
+            seen.add(code)
+            functions.append(code)
+    return "import pytest\nimport requests\n\n\n" + "\n\n".join(functions)
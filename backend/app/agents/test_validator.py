@@ -0,0 +1,179 @@
+import os
+import ast
+import importlib
+import importlib.util
+from functools import lru_cache
+from importlib.metadata import entry_points
+from typing import List, Dict, Any, Optional, Set, Callable, Iterable, FrozenSet
+
+# Fixtures pytest (and its bundled plugins) provide without a conftest
+BUILTIN_FIXTURES = {
+    "request", "tmp_path", "tmp_path_factory", "tmpdir", "tmpdir_factory", "monkeypatch",
+    "capsys", "capsysbinary", "capfd", "capfdbinary", "caplog", "recwarn", "pytestconfig",
+    "record_property", "record_xml_attribute", "record_testsuite_property", "cache", "doctest_namespace",
+}
+
+class TestValidationError(ValueError):
+    """Raised when generated or healed test code fails validation (even after a repair attempt)."""
+    # Named like a test class; keeps pytest from trying to collect it where it's imported
+    __test__ = False
+
+def _is_fixture(node: ast.AST) -> bool:
+    for dec in getattr(node, "decorator_list", []):
+        target = dec.func if isinstance(dec, ast.Call) else dec
+        if isinstance(target, ast.Attribute) and target.attr == "fixture":
+            return True
+        if isinstance(target, ast.Name) and target.id == "fixture":
+            return True
+    return False
+
+def _parametrized_names(node: ast.AST) -> Set[str]:
+    """Argument names supplied by @pytest.mark.parametrize("a, b", ...)."""
+    names = set()
+    for dec in getattr(node, "decorator_list", []):
+        if (isinstance(dec, ast.Call) and isinstance(dec.func, ast.Attribute) and dec.func.attr == "parametrize"
+                and dec.args and isinstance(dec.args[0], ast.Constant) and isinstance(dec.args[0].value, str)):
+            names.update(n.strip() for n in dec.args[0].value.split(",") if n.strip())
+    return names
+
+def _arg_names(node: ast.AST) -> List[str]:
+    args = node.args
+    return [a.arg for a in args.posonlyargs + args.args + args.kwonlyargs if a.arg not in ("self", "cls")]
+
+@lru_cache(maxsize=1)
+def plugin_fixtures() -> FrozenSet[str]:
+    """
+    Fixtures provided by installed pytest plugins (e.g. `mocker` from pytest-mock),
+    found through their pytest11 entry points. Collected once per process.
+    """
+    try:
+        from _pytest.fixtures import getfixturemarker
+    except ImportError:
+        return frozenset()
+    fixtures: Set[str] = set()
+    for entry_point in entry_points(group="pytest11"):
+        try:
+            module = importlib.import_module(entry_point.value.split(":")[0])
+        except Exception as e:
+            print(f"[TestValidator] Could not load pytest plugin {entry_point.name}: {e}")
+            continue
+        for attr, obj in list(vars(module).items()):
+            try:
+                marker = getfixturemarker(obj)
+            except Exception:
+                continue
+            if marker is not None:
+                fixtures.add(marker.name or attr)
+    return frozenset(fixtures)
+
+def _conftest_fixtures(directory: str) -> Set[str]:
+    """Fixtures defined in conftest.py files from `directory` up to the working directory."""
+    fixtures: Set[str] = set()
+    directory = os.path.abspath(directory)
+    stop = os.path.abspath(os.getcwd())
+    while True:
+        conftest = os.path.join(directory, "conftest.py")
+        if os.path.exists(conftest):
+            try:
+                with open(conftest, "r") as f:
+                    tree = ast.parse(f.read())
+                fixtures |= {n.name for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and _is_fixture(n)}
+            except (OSError, SyntaxError):
+                pass
+        parent = os.path.dirname(directory)
+        if directory == stop or parent == directory:
+            return fixtures
+        directory = parent
+
+def validate_test_code(code: str, path: Optional[str] = None, min_tests: int = 1,
+                       known_fixtures: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Checks a pytest module without running it: it must parse, its imports must
+    resolve, every argument of a test or fixture must be a known fixture (pytest's
+    own, an installed plugin's, a conftest's or a parametrized name), test names must be unique and there must be at least
+    `min_tests` tests. `path` is where the file will live, for conftest lookup;
+    `known_fixtures` are provided from elsewhere (e.g. the merged suite's header).
+    Returns {"valid", "errors", "test_count"}.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return {"valid": False, "errors": [f"SyntaxError: {e.msg} (line {e.lineno})"], "test_count": 0}
+
+    errors: List[str] = []
+    missing_modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level:
+            errors.append(f"Relative import on line {node.lineno}; the suite runs as a standalone file")
+            continue
+        modules = [a.name for a in node.names] if isinstance(node, ast.Import) else \
+                  [node.module] if isinstance(node, ast.ImportFrom) and node.module else []
+        for module in modules:
+            top = module.split(".")[0]
+            if top not in missing_modules and importlib.util.find_spec(top) is None:
+                missing_modules.add(top)
+                errors.append(f"Module '{top}' is not installed (imported on line {node.lineno})")
+
+    functions = [n for n in tree.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    for cls in tree.body:
+        if isinstance(cls, ast.ClassDef) and cls.name.startswith("Test"):
+            functions += [n for n in cls.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+    fixtures = set(BUILTIN_FIXTURES) | plugin_fixtures() | set(known_fixtures) | {n.name for n in functions if _is_fixture(n)}
+    if path:
+        fixtures |= _conftest_fixtures(os.path.dirname(os.path.abspath(path)))
+
+    tests = [n for n in functions if n.name.startswith("test_") and not _is_fixture(n)]
+    seen: Set[str] = set()
+    for node in tests:
+        if node.name in seen:
+            errors.append(f"{node.name} is defined more than once; only the last definition would run")
+        seen.add(node.name)
+
+    for node in functions:
+        if not (_is_fixture(node) or node in tests):
+            continue
+        known = fixtures | _parametrized_names(node)
+        for arg in _arg_names(node):
+            if arg not in known:
+                errors.append(f"{node.name} (line {node.lineno}) uses unknown fixture '{arg}'")
+
+    if len(tests) < min_tests:
+        errors.append(f"Found {len(tests)} test functions, expected at least {min_tests}")
+    return {"valid": not errors, "errors": errors, "test_count": len(tests)}
+
+def build_repair_prompt(code: str, errors: List[str]) -> str:
+    problems = "\n".join(f"- {e}" for e in errors)
+    return (
+        "This pytest module fails validation before it can run:\n"
+        f"{problems}\n\n"
+        "Fix exactly these problems and change nothing else. Keep every "
+        "`# --- section: ... ---` comment line. Return ONLY the complete corrected "
+        "Python code.\n\n"
+        f"```python\n{code}\n```\n"
+    )
+
+def validate_or_repair(code: str, client: Any, clean: Callable[[str], str], label: str = "tests",
+                       path: Optional[str] = None, min_tests: int = 1, known_fixtures: Iterable[str] = (),
+                       prompt: Optional[str] = None) -> str:
+    """
+    Validates `code` and, if that fails, asks the LLM once to fix the reported
+    problems (a short prompt, far cheaper than regenerating or a pytest run).
+    Returns valid code or raises TestValidationError.
+
+    `prompt` is the one that produced `code`: its cached answer is dropped when
+    the code doesn't validate, so asking again gets a fresh answer rather than
+    the same broken one. The repair itself never comes from the cache.
+    """
+    report = validate_test_code(code, path, min_tests, known_fixtures)
+    if report["valid"]:
+        return code
+    if prompt is not None:
+        client.forget(prompt)
+    print(f"[{label}] Validation failed ({'; '.join(report['errors'])}); asking for a repair...")
+    repaired = clean(client.generate_content(build_repair_prompt(code, report["errors"]), use_cache=False))
+    report = validate_test_code(repaired, path, min_tests, known_fixtures)
+    if not report["valid"]:
+        raise TestValidationError("; ".join(report["errors"]))
+    print(f"[{label}] Repair passed validation ({report['test_count']} tests).")
+    return repaired
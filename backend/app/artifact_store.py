@@ -0,0 +1,187 @@
+import os
+import re
+import gzip
+import json
+import uuid
+import shutil
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
+
+# Test runs kept per user; older run folders are removed when a new run is saved
+ARTIFACT_MAX_RUNS = int(os.getenv("ARTIFACT_MAX_RUNS", "50"))
+ARTIFACT_READ_CHUNK_BYTES = 64 * 1024
+# Logs are compressed in independent pieces of this many bytes, so a range read
+# only decompresses from the piece it starts in
+ARTIFACT_LOG_CHUNK_BYTES = 256 * 1024
+
+_RUN_ID = re.compile(r'^[0-9]{14}-[0-9a-f]{8}$')
+
+class ArtifactStore:
+    """
+    Keeps the bulky output of each test run out of session state:
+
+        storage/users/<user_id>/runs/<run_id>/logs.txt.gz       raw pytest output
+        storage/users/<user_id>/runs/<run_id>/logs.idx.json     where each log piece starts
+        storage/users/<user_id>/runs/<run_id>/report.xml.gz     JUnit XML report
+        storage/users/<user_id>/runs/<run_id>/failures.json.gz  parsed failures
+        storage/users/<user_id>/runs/<run_id>/meta.json         summary and sizes
+
+    Session state only holds the small reference returned by `save_run`.
+    """
+    def __init__(self, root: str = os.path.join("storage", "users"), max_runs: int = ARTIFACT_MAX_RUNS,
+                 remove: Optional[Callable[[str], Any]] = None, log_chunk_bytes: int = ARTIFACT_LOG_CHUNK_BYTES):
+        self.root = root
+        self.max_runs = max_runs
+        self.log_chunk_bytes = log_chunk_bytes
+        # Lets the app hand old runs to the storage reaper instead of deleting inline
+        self._remove = remove or (lambda path: shutil.rmtree(path, ignore_errors=True))
+
+    def runs_dir(self, user_id: str) -> str:
+        return os.path.join(self.root, user_id, "runs")
+
+    def run_dir(self, user_id: str, run_id: str) -> Optional[str]:
+        """None for anything that isn't a well-formed run ID, so IDs can't escape the runs folder."""
+        if not _RUN_ID.match(run_id or ""):
+            return None
+        return os.path.join(self.runs_dir(user_id), run_id)
+
+    def save_run(self, user_id: str, results: Dict[str, Any], report_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Writes logs, report and failures of one run compressed to disk and
+        returns the summary reference to keep in session state.
+        """
+        run_id = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        run_dir = self.run_dir(user_id, run_id)
+        tmp_dir = run_dir + ".tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        logs = (results.get("logs") or "").encode("utf-8")
+        self._write_log(tmp_dir, logs)
+        failures = results.get("failures") or []
+        with gzip.open(os.path.join(tmp_dir, "failures.json.gz"), "wt", encoding="utf-8") as f:
+            json.dump(failures, f)
+        if report_path and os.path.exists(report_path):
+            with open(report_path, "rb") as src, gzip.open(os.path.join(tmp_dir, "report.xml.gz"), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+
+        reference = {
+            "run_id": run_id,
+            "created_at": datetime.now().isoformat(),
+            "status": results.get("status"),
+            "summary": results.get("summary", {}),
+            "reward": results.get("reward", 0),
+            "message": results.get("message"),
+            "test_file": results.get("test_file"),
+            "failure_count": len(failures),
+            "log_bytes": len(logs),
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(reference, f)
+        # The run only becomes visible once all of its files are complete
+        os.replace(tmp_dir, run_dir)
+
+        self.prune(user_id)
+        return reference
+
+    def _write_log(self, run_dir: str, logs: bytes):
+        """
+        Writes the log as one gzip member per `log_chunk_bytes` of output (together
+        still an ordinary .gz file) plus the compressed offset of each member.
+        """
+        chunk_bytes = self.log_chunk_bytes
+        offsets = []
+        with open(os.path.join(run_dir, "logs.txt.gz"), "wb") as f:
+            for i in range(0, len(logs), chunk_bytes):
+                offsets.append(f.tell())
+                f.write(gzip.compress(logs[i:i + chunk_bytes], mtime=0))
+        with open(os.path.join(run_dir, "logs.idx.json"), "w") as f:
+            json.dump({"chunk_bytes": chunk_bytes, "offsets": offsets}, f)
+
+    def list_runs(self, user_id: str) -> List[str]:
+        runs_dir = self.runs_dir(user_id)
+        if not os.path.isdir(runs_dir):
+            return []
+        # Run IDs start with a timestamp, so name order is age order
+        return sorted(name for name in os.listdir(runs_dir) if _RUN_ID.match(name))
+
+    def prune(self, user_id: str):
+        runs = self.list_runs(user_id)
+        for run_id in runs[:max(0, len(runs) - self.max_runs)]:
+            self._remove(os.path.join(self.runs_dir(user_id), run_id))
+
+    def load_meta(self, user_id: str, run_id: str) -> Optional[Dict[str, Any]]:
+        run_dir = self.run_dir(user_id, run_id)
+        if not run_dir or not os.path.exists(os.path.join(run_dir, "meta.json")):
+            return None
+        with open(os.path.join(run_dir, "meta.json"), "r") as f:
+            return json.load(f)
+
+    def load_failures(self, user_id: str, run_id: str) -> Optional[List[Dict[str, Any]]]:
+        run_dir = self.run_dir(user_id, run_id)
+        path = os.path.join(run_dir, "failures.json.gz") if run_dir else None
+        if not path or not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def report_path(self, user_id: str, run_id: str) -> Optional[str]:
+        run_dir = self.run_dir(user_id, run_id)
+        path = os.path.join(run_dir, "report.xml.gz") if run_dir else None
+        return path if path and os.path.exists(path) else None
+
+    def log_size(self, user_id: str, run_id: str) -> Optional[int]:
+        meta = self.load_meta(user_id, run_id)
+        return meta.get("log_bytes") if meta else None
+
+    def iter_logs(self, user_id: str, run_id: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Yields the uncompressed log bytes start..end (inclusive) in chunks.
+        Only the requested range is held in memory, whatever the log size, and
+        reading starts at the log piece holding `start`. Runs saved before logs
+        were split have no index and are decompressed from the beginning.
+        """
+        run_dir = self.run_dir(user_id, run_id)
+        try:
+            with open(os.path.join(run_dir, "logs.idx.json"), "r") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = None
+        remaining = None if end is None else end - start + 1
+        with open(os.path.join(run_dir, "logs.txt.gz"), "rb") as raw:
+            if index and index["offsets"]:
+                piece = min(start // index["chunk_bytes"], len(index["offsets"]) - 1)
+                raw.seek(index["offsets"][piece])
+                start -= piece * index["chunk_bytes"]
+            with gzip.GzipFile(fileobj=raw, mode="rb") as f:
+                f.seek(start)
+                while remaining is None or remaining > 0:
+                    size = ARTIFACT_READ_CHUNK_BYTES if remaining is None else min(ARTIFACT_READ_CHUNK_BYTES, remaining)
+                    chunk = f.read(size)
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+
+def parse_range(header: Optional[str], total: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single "bytes=start-end" / "bytes=start-" / "bytes=-suffix" range.
+    Returns None when there is no usable header; raises ValueError when the range
+    can't be satisfied.
+    """
+    if not header:
+        return None
+    match = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', header)
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    first, last = match.group(1), match.group(2)
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, total - suffix), total - 1
+    start = int(first)
+    end = min(int(last), total - 1) if last else total - 1
+    if start >= total or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, end
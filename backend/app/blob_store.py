@@ -0,0 +1,143 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from typing import List, Dict, Any, Optional
+
+from app.agents.scanner import SCAN_INDEX_VERSION
+
+class BlobWriter:
+    """Writes an upload to a temp file while hashing it, then files it under its hash."""
+    def __init__(self, store: "BlobStore"):
+        self.store = store
+        self._hash = hashlib.sha256()
+        self.size = 0
+        fd, self._tmp_path = tempfile.mkstemp(prefix="upload_", suffix=".part", dir=store.tmp_dir)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        self._file.write(chunk)
+
+    def commit(self, owner: Optional[str] = None) -> str:
+        """
+        Returns the content hash. Identical content already in the store is kept
+        and the temp file dropped. With `owner`, the reference is taken before the
+        blob is filed, so the reaper never sees it unreferenced in between.
+        """
+        self._file.close()
+        content_hash = self._hash.hexdigest()
+        if owner:
+            self.store.add_ref(content_hash, owner)
+        blob_path = self.store.blob_path(content_hash)
+        if os.path.exists(blob_path):
+            os.remove(self._tmp_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(self._tmp_path, blob_path)
+        self.store.touch(content_hash)
+        return content_hash
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+class BlobStore:
+    """
+    Content-addressed store for uploaded archives. Each distinct archive is kept
+    once, together with its lazily extracted tree and its scan result:
+
+        storage/cas/<hash[:2]>/<hash>/source.zip      the archive
+        storage/cas/<hash[:2]>/<hash>/source/         files extracted on demand
+        storage/cas/<hash[:2]>/<hash>/endpoints.json  cached scan result
+        storage/cas/<hash[:2]>/<hash>/refs/<owner>    one per session using it
+
+    Entries are shared read-only by every session that uploads the same bytes.
+    Sessions get their own link to the archive and hold a reference until they
+    move on to another project; the reaper only evicts whole entries nobody
+    references.
+    """
+    # Folder the shared tree is extracted to, whatever the upload was called
+    # (pass as the scanner's `root_name`)
+    ROOT_NAME = "source"
+
+    def __init__(self, root: str = os.path.join("storage", "cas")):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def entry_dir(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], content_hash)
+
+    def blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.entry_dir(content_hash), "source.zip")
+
+    def extract_dir(self, content_hash: str) -> str:
+        # The scanner extracts to <extract_dir>/<root_name>, i.e. .../<hash>/source/
+        return self.entry_dir(content_hash)
+
+    def touch(self, content_hash: str):
+        """Marks an entry as recently used (the storage reaper evicts least recently used first)."""
+        os.utime(self.entry_dir(content_hash), None)
+
+    def refs_dir(self, content_hash: str) -> str:
+        return os.path.join(self.entry_dir(content_hash), "refs")
+
+    def add_ref(self, content_hash: str, owner: str):
+        refs_dir = self.refs_dir(content_hash)
+        os.makedirs(refs_dir, exist_ok=True)
+        with open(os.path.join(refs_dir, owner), "w"):
+            pass
+
+    def release(self, content_hash: str, owner: str):
+        """Drops `owner`'s reference; the entry becomes evictable once nobody holds one."""
+        try:
+            os.remove(os.path.join(self.refs_dir(content_hash), owner))
+        except FileNotFoundError:
+            pass
+
+    def refs(self, content_hash: str) -> List[str]:
+        try:
+            return os.listdir(self.refs_dir(content_hash))
+        except FileNotFoundError:
+            return []
+
+    def new_writer(self) -> BlobWriter:
+        return BlobWriter(self)
+
+    def link_into(self, content_hash: str, dest_path: str):
+        """
+        Makes the blob visible at `dest_path` (hard link, or a copy where links
+        aren't supported). Whether the link count went up says nothing about who
+        uses the entry; references are tracked with add_ref/release.
+        """
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        try:
+            os.link(self.blob_path(content_hash), dest_path)
+        except OSError:
+            shutil.copyfile(self.blob_path(content_hash), dest_path)
+
+    def load_scan_result(self, content_hash: str) -> Optional[List[Dict[str, Any]]]:
+        path = os.path.join(self.entry_dir(content_hash), "endpoints.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            # Results from older detector versions are recomputed
+            if data.get("version") == SCAN_INDEX_VERSION:
+                return data["endpoints"]
+        except Exception as e:
+            print(f"[BlobStore] Ignoring unreadable scan result for {content_hash}: {e}")
+        return None
+
+    def save_scan_result(self, content_hash: str, endpoints: List[Dict[str, Any]]):
+        path = os.path.join(self.entry_dir(content_hash), "endpoints.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": SCAN_INDEX_VERSION, "endpoints": endpoints}, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,337 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.run_history import RunHistory
+
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join("storage", "history.db"))
+# Runs kept per user once their history is pruned
+HISTORY_MAX_RUNS = int(os.getenv("HISTORY_MAX_RUNS", "1000"))
+# A user's history may grow to this many times HISTORY_MAX_RUNS runs before it is pruned
+HISTORY_COMPACT_FACTOR = 2
+
+# SQLite expressions turning an ISO timestamp into a trend bucket label
+TREND_BUCKETS = {
+    "day": "substr(timestamp, 1, 10)",
+    "week": "strftime('%Y-W%W', substr(timestamp, 1, 10))",
+    "month": "substr(timestamp, 1, 7)",
+}
+
+class HistoryCursorError(ValueError):
+    """The paging cursor is malformed."""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    project_name TEXT,
+    timestamp TEXT NOT NULL,
+    status TEXT,
+    reward REAL,
+    passed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    test_file TEXT,
+    run_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_user_time ON runs (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_runs_user_project_time ON runs (user_id, project_name, timestamp);
+CREATE INDEX IF NOT EXISTS idx_runs_user_status_time ON runs (user_id, status, timestamp);
+CREATE TABLE IF NOT EXISTS imported_logs (
+    user_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id TEXT PRIMARY KEY,
+    total_runs INTEGER NOT NULL DEFAULT 0,
+    passed_runs INTEGER NOT NULL DEFAULT 0,
+    reward_sum REAL NOT NULL DEFAULT 0,
+    reward_count INTEGER NOT NULL DEFAULT 0,
+    active_projects INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS user_projects (
+    user_id TEXT NOT NULL,
+    project_name TEXT NOT NULL,
+    PRIMARY KEY (user_id, project_name)
+);
+"""
+
+# Bumped whenever derived tables change shape; older databases get them rebuilt
+SCHEMA_VERSION = 1
+
+class HistoryDB:
+    """
+    Run history for all users in one SQLite database (storage/history.db).
+    Filtering, paging and statistics run as indexed SQL queries instead of
+    loading a user's whole history into Python.
+
+    Existing per-user run_history.json files are imported
+    the first time a user's history is touched. Once a user has more than
+    HISTORY_COMPACT_FACTOR * max_runs runs, only the newest max_runs are kept.
+    """
+    def __init__(self, path: str = HISTORY_DB_PATH, legacy_root: str = os.path.join("storage", "users"),
+                 max_runs: int = HISTORY_MAX_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        self.legacy = RunHistory(root=legacy_root)
+        self._local = threading.local()
+        self._import_lock = threading.Lock()
+        self._imported: set = set()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.executescript(SCHEMA)
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self.rebuild_stats()
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Writes ---
+
+    @staticmethod
+    def _row_values(user_id: str, entry: Dict[str, Any]) -> Tuple:
+        summary = entry.get("summary") or {}
+        return (
+            user_id,
+            entry.get("project_name"),
+            entry.get("timestamp", ""),
+            entry.get("status"),
+            entry.get("reward"),
+            summary.get("passed", 0),
+            summary.get("failed", 0),
+            summary.get("error", 0),
+            summary.get("total", 0),
+            json.dumps(summary),
+            entry.get("test_file"),
+            entry.get("run_id"),
+        )
+
+    def _insert(self, conn: sqlite3.Connection, user_id: str, entry: Dict[str, Any]) -> int:
+        cursor = conn.execute(
+            "INSERT INTO runs (user_id, project_name, timestamp, status, reward, passed, failed, errors, total,"
+            " summary, test_file, run_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            self._row_values(user_id, entry)
+        )
+        self._update_stats(conn, user_id, entry)
+        return cursor.lastrowid
+
+    @staticmethod
+    def _update_stats(conn: sqlite3.Connection, user_id: str, entry: Dict[str, Any]):
+        """Folds one run into the user's counters, in the same transaction as the insert."""
+        new_project = conn.execute(
+            "INSERT OR IGNORE INTO user_projects (user_id, project_name) VALUES (?, ?)",
+            (user_id, entry.get("project_name") or "")
+        ).rowcount
+        reward = entry.get("reward")
+        conn.execute(
+            "INSERT INTO user_stats (user_id, total_runs, passed_runs, reward_sum, reward_count, active_projects)"
+            " VALUES (?, 1, ?, ?, ?, ?)"
+            " ON CONFLICT (user_id) DO UPDATE SET"
+            " total_runs = total_runs + 1,"
+            " passed_runs = passed_runs + excluded.passed_runs,"
+            " reward_sum = reward_sum + excluded.reward_sum,"
+            " reward_count = reward_count + excluded.reward_count,"
+            " active_projects = active_projects + excluded.active_projects",
+            (user_id, int(entry.get("status") == "passed"), reward or 0, int(reward is not None), new_project)
+        )
+
+    def rebuild_stats(self, user_id: Optional[str] = None):
+        """Recomputes the counters from the runs table, for one user or everybody."""
+        conn = self._connect()
+        with conn:
+            self._rebuild_stats(conn, user_id)
+
+    @staticmethod
+    def _rebuild_stats(conn: sqlite3.Connection, user_id: Optional[str]):
+        where, params = ("WHERE user_id = ?", (user_id,)) if user_id else ("", ())
+        conn.execute(f"DELETE FROM user_stats {where}", params)
+        conn.execute(f"DELETE FROM user_projects {where}", params)
+        conn.execute(
+            "INSERT INTO user_projects (user_id, project_name)"
+            f" SELECT DISTINCT user_id, COALESCE(project_name, '') FROM runs {where}",
+            params
+        )
+        conn.execute(
+            "INSERT INTO user_stats (user_id, total_runs, passed_runs, reward_sum, reward_count, active_projects)"
+            " SELECT user_id, COUNT(*), SUM(status = 'passed'), COALESCE(SUM(reward), 0), COUNT(reward),"
+            " COUNT(DISTINCT COALESCE(project_name, ''))"
+            f" FROM runs {where} GROUP BY user_id",
+            params
+        )
+
+    def _apply_retention(self, conn: sqlite3.Connection, user_id: str):
+        """
+        Drops all but the newest max_runs runs once a user has more than
+        HISTORY_COMPACT_FACTOR times that many, so the cost is paid rarely.
+        """
+        row = conn.execute("SELECT total_runs FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None or row["total_runs"] <= self.max_runs * HISTORY_COMPACT_FACTOR:
+            return
+        conn.execute(
+            "DELETE FROM runs WHERE user_id = ? AND id NOT IN"
+            " (SELECT id FROM runs WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?)",
+            (user_id, user_id, self.max_runs)
+        )
+        # Dashboard totals cover the runs that are kept
+        self._rebuild_stats(conn, user_id)
+
+    def record_run(self, user_id: str, entry: Dict[str, Any]) -> int:
+        self._ensure_imported(user_id)
+        conn = self._connect()
+        with conn:
+            row_id = self._insert(conn, user_id, entry)
+            self._apply_retention(conn, user_id)
+            return row_id
+
+    def _ensure_imported(self, user_id: str):
+        """
+        Copies the user's file-based history into the database once. Claiming the
+        import is the first write of the transaction, so another worker process
+        importing the same user waits on it and then finds the claim taken.
+        """
+        if user_id in self._imported:
+            return
+        with self._import_lock:
+            if user_id in self._imported:
+                return
+            conn = self._connect()
+            with conn:
+                claimed = conn.execute(
+                    "INSERT OR IGNORE INTO imported_logs (user_id) VALUES (?)", (user_id,)
+                ).rowcount
+                if claimed:
+                    entries = self.legacy.entries(user_id)
+                    for entry in entries:
+                        self._insert(conn, user_id, entry)
+                    self._apply_retention(conn, user_id)
+                    if entries:
+                        print(f"[HistoryDB] Imported {len(entries)} runs for {user_id}")
+            self._imported.add(user_id)
+
+    # --- Reads ---
+
+    @staticmethod
+    def _filters(user_id: str, project: Optional[str], status: Optional[str],
+                 since: Optional[str], until: Optional[str]) -> Tuple[str, List[Any]]:
+        clauses, params = ["user_id = ?"], [user_id]
+        if project:
+            clauses.append("project_name = ?")
+            params.append(project)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            # A bare date includes the whole day
+            clauses.append("timestamp <= ?")
+            params.append(until + "T23:59:59.999999" if len(until) == 10 else until)
+        return " AND ".join(clauses), params
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "timestamp": row["timestamp"],
+            "project_name": row["project_name"],
+            "status": row["status"],
+            "reward": row["reward"],
+            "summary": json.loads(row["summary"]) if row["summary"] else {},
+            "test_file": row["test_file"],
+            "run_id": row["run_id"],
+        }
+
+    def query_runs(self, user_id: str, project: Optional[str] = None, status: Optional[str] = None,
+                   since: Optional[str] = None, until: Optional[str] = None,
+                   cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Runs matching the filters, newest first, plus the cursor for the next page.
+        Pages are keyed on (timestamp, id), so new runs never shift later pages.
+        """
+        self._ensure_imported(user_id)
+        where, params = self._filters(user_id, project, status, since, until)
+        if cursor:
+            try:
+                cursor_time, cursor_id = cursor.rsplit("|", 1)
+                cursor_id = int(cursor_id)
+            except ValueError:
+                raise HistoryCursorError("Malformed history cursor")
+            where += " AND (timestamp < ? OR (timestamp = ? AND id < ?))"
+            params += [cursor_time, cursor_time, cursor_id]
+
+        rows = self._connect().execute(
+            f"SELECT * FROM runs WHERE {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['timestamp']}|{rows[-1]['id']}"
+        return [self._entry(row) for row in rows], next_cursor
+
+    def stats(self, user_id: str) -> Dict[str, Any]:
+        """Dashboard totals, read from counters kept up to date on every insert."""
+        self._ensure_imported(user_id)
+        row = self._connect().execute(
+            "SELECT total_runs, passed_runs, reward_sum, reward_count, active_projects FROM user_stats WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return {"total_runs": 0, "passed_runs": 0, "avg_reward": 0, "active_projects": 0}
+        return {
+            "total_runs": row["total_runs"],
+            "passed_runs": row["passed_runs"],
+            "avg_reward": row["reward_sum"] / row["reward_count"] if row["reward_count"] else 0,
+            "active_projects": row["active_projects"],
+        }
+
+    def trends(self, user_id: str, bucket: str = "day", project: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Pass rate and reward per day, week or month, oldest first."""
+        if bucket not in TREND_BUCKETS:
+            raise ValueError(f"bucket must be one of: {', '.join(TREND_BUCKETS)}")
+        self._ensure_imported(user_id)
+        where, params = self._filters(user_id, project, None, since, until)
+        rows = self._connect().execute(
+            f"SELECT {TREND_BUCKETS[bucket]} AS period, COUNT(*) AS runs,"
+            " SUM(status = 'passed') AS passed_runs, AVG(reward) AS avg_reward,"
+            " SUM(passed) AS tests_passed, SUM(total) AS tests_total"
+            f" FROM runs WHERE {where} GROUP BY period ORDER BY period",
+            params
+        ).fetchall()
+        return [
+            {
+                "period": row["period"],
+                "runs": row["runs"],
+                "passed_runs": row["passed_runs"],
+                "pass_rate": row["passed_runs"] / row["runs"] if row["runs"] else 0,
+                "avg_reward": row["avg_reward"] or 0,
+                "test_pass_rate": row["tests_passed"] / row["tests_total"] if row["tests_total"] else 0,
+            }
+            for row in rows
+        ]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintenance for the run history database")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: recompute dashboard counters from the runs table")
+    parser.add_argument("--user", help="Only rebuild this user's counters")
+    parser.add_argument("--db", default=HISTORY_DB_PATH, help="Path to history.db")
+    args = parser.parse_args()
+
+    HistoryDB(path=args.db).rebuild_stats(args.user)
+    print(f"Rebuilt dashboard counters for {args.user or 'all users'} in {args.db}")
@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable, AsyncIterator
+
+from app.session_store import write_json_atomic
+
+# Scans and clones are I/O heavy and release the GIL for most of their time,
+# so a small thread pool keeps many uploads moving without blocking the event loop
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs are kept this long so clients can still fetch the result
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+# Job state shared by every worker process, one <job id>.json per job
+JOBS_DIR = os.path.join("storage", "jobs")
+# Progress is written out at most this often; status changes always are
+JOB_PERSIST_INTERVAL_SECONDS = 0.25
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+class JobCancelled(Exception):
+    """Raised from a job's progress callback once the job has been cancelled."""
+
+class Job:
+    """A background scan or clone started by one user."""
+    def __init__(self, user_id: str, kind: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.kind = kind
+        self.status = "queued"
+        self.progress = {"stage": "queued", "done": 0, "total": 0}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Bumped on every change so event streams know when to push an update
+        self.version = 0
+        self.cancel_requested = False
+        # Set by the JobManager running the job, to persist each change
+        self.on_change: Optional[Callable[["Job", bool], None]] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def _touch(self, force: bool = True):
+        self.updated_at = time.time()
+        self.version += 1
+        if self.on_change:
+            self.on_change(self, force)
+
+    def report_progress(self, stage: str, done: int, total: int):
+        """Matches the scanner's progress_callback signature. Raises JobCancelled once cancelled."""
+        self.progress = {"stage": stage, "done": done, "total": total}
+        self._touch(force=False)
+        if self.cancel_requested:
+            raise JobCancelled(f"{self.kind} job {self.id} was cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "error_status": self.error_status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        job = cls(data["user_id"], data["kind"])
+        job.id = data["job_id"]
+        for field in ("status", "progress", "result", "error", "error_status", "created_at", "updated_at", "version"):
+            setattr(job, field, data[field])
+        return job
+
+class JobManager:
+    """
+    Runs blocking work (scans, clones) on a worker pool. Each job's state is
+    kept in memory by the process running it and written to storage/jobs, so
+    /jobs/{id}, its event stream and cancelling work from any worker process.
+
+    Cancelling is cooperative: a queued job never starts, and a running one
+    stops at its next progress report. Another worker asks for it by leaving
+    a <job id>.cancel marker, which the running process picks up when it next
+    persists progress.
+    """
+    def __init__(self, max_workers: int = JOB_WORKERS, jobs_dir: str = JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._persisted_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _path(self, job_id: str, suffix: str = ".json") -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}{suffix}")
+
+    def _persist(self, job: Job, force: bool = True):
+        now = time.monotonic()
+        if not force and now - self._persisted_at.get(job.id, 0.0) < JOB_PERSIST_INTERVAL_SECONDS:
+            return
+        self._persisted_at[job.id] = now
+        write_json_atomic(self._path(job.id), dict(job.to_dict(), user_id=job.user_id, version=job.version))
+        if not job.cancel_requested and os.path.exists(self._path(job.id, ".cancel")):
+            job.cancel_requested = True
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        """A job run by another worker process, as it last wrote it out."""
+        try:
+            with open(self._path(job_id), "r") as f:
+                return Job.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[Jobs] Could not read job {job_id}: {e}")
+            return None
+
+    def submit(self, user_id: str, kind: str, func: Callable[..., Dict[str, Any]], *args, **kwargs) -> Job:
+        """
+        Queues `func(*args, progress_callback=job.report_progress, **kwargs)`.
+        Its return value becomes the job result.
+        """
+        self._purge_expired()
+        job = Job(user_id, kind)
+        job.on_change = self._persist
+        with self._lock:
+            self._jobs[job.id] = job
+        self._persist(job)
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job: Job, func: Callable[..., Dict[str, Any]], args, kwargs):
+        if job.cancel_requested or os.path.exists(self._path(job.id, ".cancel")):
+            job.status = "cancelled"
+            job._touch()
+            return
+        job.status = "running"
+        job._touch()
+        try:
+            job.result = func(*args, progress_callback=job.report_progress, **kwargs)
+            job.status = "completed"
+        except JobCancelled as e:
+            print(f"[Jobs] {e}")
+            job.error = "Cancelled"
+            job.status = "cancelled"
+        except Exception as e:
+            print(f"[Jobs] {job.kind} job {job.id} failed: {e}")
+            traceback.print_exc()
+            job.error = getattr(e, "detail", None) or str(e)
+            job.error_status = getattr(e, "status_code", 500)
+            job.status = "failed"
+        job._touch()
+
+    def get(self, job_id: str, user_id: str) -> Optional[Job]:
+        """Jobs are only visible to the user who started them."""
+        job = self._jobs.get(job_id)
+        if job is None and _JOB_ID.fullmatch(job_id):
+            job = self._load(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def cancel(self, job_id: str, user_id: str) -> Optional[Job]:
+        """
+        Asks a job to stop. Returns the job (finished ones are left as they are),
+        or None if the user has no such job.
+        """
+        job = self.get(job_id, user_id)
+        if job is None or job.finished:
+            return job
+        if job.id in self._jobs:
+            job.cancel_requested = True
+            if job.status == "queued":
+                # Not picked up yet: report it cancelled now rather than when a worker frees up
+                job.status = "cancelled"
+                job._touch()
+        else:
+            with open(self._path(job.id, ".cancel"), "w"):
+                pass
+        return job
+
+    def _purge_expired(self):
+        cutoff = time.time() - JOB_TTL_SECONDS
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.updated_at < cutoff]:
+                del self._jobs[job_id]
+                self._persisted_at.pop(job_id, None)
+        # Files of every worker's jobs, including workers that have since gone away.
+        # Age alone says nothing about a running job that hasn't reported progress
+        # for a while, so only finished ones are removed.
+        for name in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, name)
+            job_id, suffix = os.path.splitext(name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if suffix in (".json", ".cancel"):
+                    job = self._jobs.get(job_id) or self._load(job_id)
+                    if job is not None and not job.finished:
+                        continue
+                # Finished jobs, markers of jobs that are gone, and temp files of interrupted writes
+                os.remove(path)
+            except OSError:
+                continue
+
+    async def stream_events(self, job: Job, poll_interval: float = 0.5) -> AsyncIterator[str]:
+        """
+        Server-Sent Events for one job: a "progress" event on every change and a
+        final "completed", "failed" or "cancelled" event carrying the full job.
+        Jobs running in another worker process are followed through their file.
+        """
+        seen_version = -1
+        while True:
+            if job.id not in self._jobs:
+                job = self._load(job.id) or job
+            if job.version != seen_version:
+                seen_version = job.version
+                event = job.status if job.finished else "progress"
+                yield f"event: {event}\ndata: {json.dumps(job.to_dict())}\n\n"
+                if job.finished:
+                    return
+            await asyncio.sleep(poll_interval)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
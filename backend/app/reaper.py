@@ -0,0 +1,303 @@
+import os
+import sys
+import stat
+import time
+import uuid
+import shutil
+import threading
+from typing import Any, Dict, List, Tuple, Optional, Callable
+
+# Upper bound for everything under storage/ (sessions, shared uploads, results)
+STORAGE_BUDGET_BYTES = int(float(os.getenv("STORAGE_BUDGET_MB", "10240")) * 1024 * 1024)
+# How often the reaper empties the trash and re-checks the budget
+REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "60"))
+# Pause between deleted trees so the reaper never saturates the disk
+REAPER_PAUSE_SECONDS = 0.05
+# How long a measurement of storage usage is trusted before storage is walked again
+REAPER_RECOUNT_SECONDS = float(os.getenv("REAPER_RECOUNT_SECONDS", "900"))
+
+def _on_rm_error(func, path, exc_info):
+    # Read-only files (e.g. git objects) can't be removed on Windows until made writable
+    try:
+        os.chmod(path, stat.S_IWRITE)
+        func(path)
+    except OSError:
+        pass
+
+def _tree_size(path: str) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+def _measure(storage_root: str) -> Tuple[int, Dict[str, int]]:
+    """
+    One walk of storage (the trash excluded): the total size, and the size of
+    every tree the reaper may evict (shared upload entries, their extracted
+    trees and sessions), keyed by path.
+    """
+    total = 0
+    sizes: Dict[str, int] = {}
+    stack: List[Tuple[str, Tuple[str, ...]]] = [(storage_root, ())]
+    while stack:
+        current, parts = stack.pop()
+        trees = []
+        if len(parts) >= 3 and parts[0] == "cas" and parts[1] != "tmp":
+            trees.append(os.path.join(storage_root, *parts[:3]))
+            if len(parts) >= 4 and parts[3] == "source":
+                trees.append(os.path.join(storage_root, *parts[:4]))
+        elif len(parts) >= 2 and parts[0] == "sessions":
+            trees.append(os.path.join(storage_root, *parts[:2]))
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if parts or entry.name != "trash":
+                                stack.append((entry.path, parts + (entry.name,)))
+                            continue
+                        size = entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+                    total += size
+                    for tree in trees:
+                        sizes[tree] = sizes.get(tree, 0) + size
+        except OSError:
+            continue
+    return total, sizes
+
+class StorageReaper:
+    """
+    Deletes session data off the request path. Callers `trash()` a folder, which
+    is an atomic rename into storage/trash, and a low-priority background thread
+    removes it later. The same thread keeps storage under STORAGE_BUDGET_BYTES by
+    evicting the least recently used trees.
+
+    Usage is measured by walking storage at most every REAPER_RECOUNT_SECONDS,
+    and kept current in between from what is written (`note_written`) and
+    trashed. Figures are only re-measured early when they say storage is over
+    budget, so nothing is evicted on a stale estimate.
+    """
+    def __init__(self, storage_root: str = "storage", budget_bytes: int = STORAGE_BUDGET_BYTES,
+                 interval: float = REAPER_INTERVAL_SECONDS):
+        self.storage_root = storage_root
+        self.trash_dir = os.path.join(storage_root, "trash")
+        self.budget_bytes = budget_bytes
+        self.interval = interval
+        # Called with the user id of every session evicted for the budget
+        self.on_session_evicted: Optional[Callable[[str], None]] = None
+        # Sessions are only evicted while holding their user lock (busy ones are skipped)
+        self.user_locks: Optional[Any] = None
+        self._usage: Optional[int] = None
+        self._sizes: Dict[str, int] = {}
+        self._measured_at = 0.0
+        self._usage_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(self.trash_dir, exist_ok=True)
+
+    def trash(self, path: str) -> bool:
+        """Moves `path` out of the way in O(1). Returns False if there was nothing to move."""
+        if not os.path.exists(path):
+            return False
+        target = os.path.join(self.trash_dir, f"{uuid.uuid4().hex}-{os.path.basename(os.path.normpath(path))}")
+        try:
+            os.replace(path, target)
+        except OSError as e:
+            # Different filesystem or a locked file: fall back to deleting in place
+            print(f"[Reaper] Could not move {path} to trash ({e}); deleting synchronously")
+            shutil.rmtree(path, onerror=_on_rm_error)
+            self._forget(path)
+            return True
+        self._forget(path)
+        self._wake.set()
+        return True
+
+    def note_written(self, nbytes: int):
+        """Accounts for data just added to storage (e.g. an upload)."""
+        with self._usage_lock:
+            if self._usage is None:
+                return
+            self._usage += nbytes
+            over = self._usage > self.budget_bytes
+        if over:
+            self._wake.set()
+
+    def _forget(self, path: str):
+        """Takes a tree that was just trashed out of the usage figures."""
+        path = os.path.normpath(path)
+        with self._usage_lock:
+            if self._usage is None:
+                return
+            inside = [p for p in self._sizes if p == path or p.startswith(path + os.sep)]
+            size = self._sizes.get(path, max((self._sizes[p] for p in inside), default=0))
+            for p in inside:
+                del self._sizes[p]
+            self._usage = max(0, self._usage - size)
+
+    def _measure(self):
+        usage, sizes = _measure(self.storage_root)
+        with self._usage_lock:
+            self._usage = usage
+            self._sizes = {os.path.normpath(p): size for p, size in sizes.items()}
+            self._measured_at = time.monotonic()
+
+    def usage(self) -> int:
+        """Bytes in storage outside the trash, re-measured once the last figures are too old."""
+        if self._usage is None or time.monotonic() - self._measured_at > REAPER_RECOUNT_SECONDS:
+            self._measure()
+        return self._usage
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="storage-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _lower_priority(self):
+        # Per-thread niceness works on Linux; elsewhere the pauses between deletions have to do
+        if sys.platform.startswith("linux") and hasattr(os, "setpriority"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+            except OSError:
+                pass
+
+    def _run(self):
+        self._lower_priority()
+        while not self._stop.is_set():
+            try:
+                self.reap_once()
+                self.enforce_budget()
+            except Exception as e:
+                print(f"[Reaper] Error during cleanup: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def reap_once(self) -> int:
+        """Deletes everything currently in the trash. Returns the number of entries removed."""
+        removed = 0
+        for name in os.listdir(self.trash_dir):
+            if self._stop.is_set():
+                break
+            path = os.path.join(self.trash_dir, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, onerror=_on_rm_error)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+            removed += 1
+            time.sleep(REAPER_PAUSE_SECONDS)
+        return removed
+
+    def _referenced(self, entry: str) -> bool:
+        """
+        Whether a session still holds a reference to a shared upload entry.
+        References of sessions that no longer exist (logged out or evicted) don't count.
+        """
+        try:
+            owners = os.listdir(os.path.join(entry, "refs"))
+        except FileNotFoundError:
+            return False
+        sessions_root = os.path.join(self.storage_root, "sessions")
+        return any(os.path.isdir(os.path.join(sessions_root, owner)) for owner in owners)
+
+    def _eviction_candidates(self) -> List[Tuple[float, str, Optional[str]]]:
+        """
+        (last used, path, session user id) for trees that may be evicted:
+        - shared upload entries no session references any more (whole entry)
+        - extracted trees of shared uploads still in use (re-extracted on demand)
+        - whole user sessions, by last state change
+        """
+        candidates = []
+        cas_root = os.path.join(self.storage_root, "cas")
+        if os.path.isdir(cas_root):
+            for prefix in os.listdir(cas_root):
+                prefix_dir = os.path.join(cas_root, prefix)
+                if prefix == "tmp" or not os.path.isdir(prefix_dir):
+                    continue
+                for content_hash in os.listdir(prefix_dir):
+                    entry = os.path.join(prefix_dir, content_hash)
+                    last_used = os.path.getmtime(entry)
+                    if not self._referenced(entry):
+                        candidates.append((last_used, entry, None))
+                    elif os.path.isdir(os.path.join(entry, "source")):
+                        candidates.append((last_used, os.path.join(entry, "source"), None))
+
+        sessions_root = os.path.join(self.storage_root, "sessions")
+        if os.path.isdir(sessions_root):
+            for user_id in os.listdir(sessions_root):
+                session = os.path.join(sessions_root, user_id)
+                state_file = os.path.join(session, "system_state.json")
+                last_used = os.path.getmtime(state_file if os.path.exists(state_file) else session)
+                candidates.append((last_used, session, user_id))
+
+        candidates.sort()
+        return candidates
+
+    def enforce_budget(self) -> int:
+        """Evicts least recently used trees until storage fits the budget. Returns bytes freed."""
+        if self.usage() <= self.budget_bytes:
+            return 0
+        if time.monotonic() - self._measured_at > self.interval:
+            # Estimates drift; check before deleting anything
+            self._measure()
+            if self._usage <= self.budget_bytes:
+                return 0
+
+        freed = 0
+        for _, path, user_id in self._eviction_candidates():
+            if self._usage <= self.budget_bytes:
+                break
+            if user_id is None:
+                if self._referenced(path):
+                    # An upload of the same bytes took a reference since the candidates were listed
+                    continue
+                freed += self._evict(path, None)
+                continue
+            if self.user_locks is None:
+                freed += self._evict(path, user_id)
+                continue
+            # Never pull a session out from under a request or job working on it
+            with self.user_locks.hold_sync(user_id, blocking=False) as locked:
+                if not locked:
+                    print(f"[Reaper] Session {user_id} is busy; not evicting it now")
+                    continue
+                freed += self._evict(path, user_id)
+        return freed
+
+    def _evict(self, path: str, user_id: Optional[str]) -> int:
+        key = os.path.normpath(path)
+        size = self._sizes.get(key)
+        if size is None:
+            # Appeared since storage was last measured
+            size = _tree_size(path)
+            with self._usage_lock:
+                self._usage += size
+                self._sizes[key] = size
+        if not self.trash(path):
+            return 0
+        print(f"[Reaper] Evicted {path} ({size} bytes) to stay within the storage budget")
+        if user_id and self.on_session_evicted:
+            self.on_session_evicted(user_id)
+        return size
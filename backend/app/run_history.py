@@ -0,0 +1,28 @@
+import os
+import json
+from typing import Dict, Any, List
+
+class RunHistory:
+    """
+    Read-only access to the file-based run history that predates history.db:
+    the storage/users/<user_id>/run_history.json array. HistoryDB imports it
+    once per user.
+    """
+    def __init__(self, root: str = os.path.join("storage", "users")):
+        self.root = root
+
+    def path(self, user_id: str) -> str:
+        return os.path.join(self.root, user_id, "run_history.json")
+
+    def entries(self, user_id: str) -> List[Dict[str, Any]]:
+        """Every recorded run, oldest first."""
+        path = self.path(user_id)
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"[RunHistory] Could not read {path}: {e}")
+            return []
+        return sorted(entries, key=lambda x: x.get("timestamp", ""))
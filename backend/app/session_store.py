@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional, Iterator
+
+# Dirty state is written this long after the first change, so every update made
+# while handling a request (or a burst of requests) lands in a single write
+STATE_FLUSH_DELAY_SECONDS = float(os.getenv("STATE_FLUSH_DELAY_SECONDS", "0.5"))
+
+def default_state() -> Dict[str, Any]:
+    return {
+        "project_name": None,
+        "upload_path": None,
+        "endpoints": [],
+        "test_file": None,
+        "latest_results": None
+    }
+
+def write_json_atomic(path: str, data: Any):
+    """Writes to a temp file beside `path` and renames it over, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+class SessionStore:
+    """
+    Per-user session state kept in memory, with write-behind persistence to
+    system_state.json. Reads never touch disk after the first load; changes are
+    flushed by a background thread after STATE_FLUSH_DELAY_SECONDS using atomic
+    temp-file-plus-rename writes.
+    """
+    def __init__(self, state_path: Callable[[str], str], flush_delay: float = STATE_FLUSH_DELAY_SECONDS):
+        self._state_path = state_path
+        self.flush_delay = flush_delay
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._dirty: set = set()
+        # (mtime, size) of the state file as last read or written by this process
+        self._stamps: Dict[str, Optional[tuple]] = {}
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._flush_loop, name="session-flusher", daemon=True)
+        self._thread.start()
+
+    def _stamp(self, user_id: str) -> Optional[tuple]:
+        try:
+            st = os.stat(self._state_path(user_id))
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _load(self, user_id: str) -> Dict[str, Any]:
+        path = self._state_path(user_id)
+        self._stamps[user_id] = self._stamp(user_id)
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"[SessionStore] Could not read state for {user_id}: {e}")
+        return default_state()
+
+    def get(self, user_id: str) -> Dict[str, Any]:
+        """
+        Returns a shallow copy of the user's state. Callers replace top-level keys
+        and hand the dict back through `put`.
+        """
+        with self._lock:
+            if user_id not in self._states:
+                self._states[user_id] = self._load(user_id)
+            return dict(self._states[user_id])
+
+    def put(self, user_id: str, state: Dict[str, Any]):
+        with self._lock:
+            self._states[user_id] = dict(state)
+            self._dirty.add(user_id)
+        self._wake.set()
+
+    @contextmanager
+    def transaction(self, user_id: str) -> Iterator[Dict[str, Any]]:
+        """Groups several updates into one `put` (and so at most one write)."""
+        state = self.get(user_id)
+        yield state
+        self.put(user_id, state)
+
+    def flush(self, user_id: Optional[str] = None):
+        """Writes dirty state now: one user's, or everybody's if no user is given."""
+        with self._lock:
+            users = [user_id] if user_id is not None else list(self._dirty)
+            for uid in users:
+                if uid not in self._dirty:
+                    continue
+                self._dirty.discard(uid)
+                try:
+                    # Written under the lock so `discard` can't race a write that
+                    # would recreate a session folder that was just removed
+                    write_json_atomic(self._state_path(uid), self._states[uid])
+                    self._stamps[uid] = self._stamp(uid)
+                except Exception as e:
+                    print(f"[SessionStore] Failed to persist state for {uid}: {e}")
+                    self._dirty.add(uid)
+
+    def discard(self, user_id: str):
+        """Forgets a user's state without writing it (logout, eviction)."""
+        with self._lock:
+            self._states.pop(user_id, None)
+            self._stamps.pop(user_id, None)
+            self._dirty.discard(user_id)
+
+    def revalidate(self, user_id: str):
+        """
+        Drops the cached state if another process has rewritten the file since we
+        last read or wrote it. Unflushed local changes are kept.
+        """
+        with self._lock:
+            if user_id in self._states and user_id not in self._dirty:
+                if self._stamp(user_id) != self._stamps.get(user_id):
+                    self._states.pop(user_id, None)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                break
+            # Let further updates in the same burst pile up before writing
+            time.sleep(self.flush_delay)
+            self.flush()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self.flush()
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Optional, Callable, Iterator, AsyncIterator
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+# How often a contended cross-process lock is retried from async code
+LOCK_POLL_SECONDS = 0.05
+
+class _FileLock:
+    """
+    Exclusive lock on a file, shared by every worker process on this machine.
+    Each instance uses its own file handle, so two instances in the same process
+    also exclude each other.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def _open(self):
+        self._file = open(self.path, "a+b")
+        self._file.seek(0)
+
+    def try_acquire(self) -> bool:
+        self._open()
+        try:
+            if sys.platform == "win32":
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+
+    def acquire(self):
+        if sys.platform == "win32":
+            # LK_LOCK gives up after ~10 seconds, so keep polling instead
+            while not self.try_acquire():
+                time.sleep(LOCK_POLL_SECONDS)
+            return
+        self._open()
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if sys.platform == "win32":
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+class UserLocks:
+    """
+    Serializes mutating work per user while different users run in parallel.
+
+    Within a process, async callers queue on a per-user asyncio.Lock so waiting
+    never ties up a thread. Across processes (several uvicorn workers) every
+    holder also takes an exclusive lock on storage/locks/<user>.lock.
+
+    `on_acquire` runs once the user is locked (e.g. to drop cached state another
+    worker may have changed) and `on_release` before it is unlocked (e.g. to
+    persist state for the next holder). From `hold`, `on_release` runs on the
+    loop's default executor, since it may write files.
+    """
+    def __init__(self, lock_dir: str = os.path.join("storage", "locks"),
+                 on_acquire: Optional[Callable[[str], None]] = None,
+                 on_release: Optional[Callable[[str], None]] = None):
+        self.lock_dir = lock_dir
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self._async_locks: Dict[str, asyncio.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def _file_lock(self, user_id: str) -> _FileLock:
+        # User IDs come from a request header, so never use them as file names directly
+        name = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        return _FileLock(os.path.join(self.lock_dir, f"{name}.lock"))
+
+    def _enter(self, user_id: str):
+        if self.on_acquire:
+            self.on_acquire(user_id)
+
+    def _exit(self, user_id: str):
+        if self.on_release:
+            self.on_release(user_id)
+
+    @asynccontextmanager
+    async def hold(self, user_id: str) -> AsyncIterator[None]:
+        """For request handlers: `async with user_locks.hold(user_id): ...`"""
+        lock = self._async_locks.setdefault(user_id, asyncio.Lock())
+        self._waiters[user_id] = self._waiters.get(user_id, 0) + 1
+        try:
+            async with lock:
+                file_lock = self._file_lock(user_id)
+                # Poll instead of blocking a thread, so a cancelled request can't leave a lock behind
+                while not file_lock.try_acquire():
+                    await asyncio.sleep(LOCK_POLL_SECONDS)
+                try:
+                    self._enter(user_id)
+                    yield
+                finally:
+                    exiting = asyncio.get_running_loop().run_in_executor(None, self._exit, user_id)
+                    try:
+                        # Shielded so a cancelled request still finishes the hand-over
+                        await asyncio.shield(exiting)
+                    finally:
+                        if exiting.done():
+                            file_lock.release()
+                        else:
+                            exiting.add_done_callback(lambda _: file_lock.release())
+        finally:
+            self._waiters[user_id] -= 1
+            if not self._waiters[user_id]:
+                del self._waiters[user_id]
+                self._async_locks.pop(user_id, None)
+
+    @contextmanager
+    def hold_sync(self, user_id: str, blocking: bool = True) -> Iterator[bool]:
+        """
+        For worker threads (background jobs): blocks until the user is free.
+        With `blocking=False` it gives up at once if the user is busy; the
+        context value says whether the lock was taken.
+        """
+        file_lock = self._file_lock(user_id)
+        if blocking:
+            file_lock.acquire()
+        elif not file_lock.try_acquire():
+            yield False
+            return
+        try:
+            self._enter(user_id)
+            yield True
+        finally:
+            try:
+                self._exit(user_id)
+            finally:
+                file_lock.release()
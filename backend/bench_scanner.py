@@ -0,0 +1,112 @@
+"""
+Benchmark for ProjectScanner worker scaling.
+
+Builds a synthetic Express project (20k files by default), then times a full
+scan with 1/2/4/8 worker processes and checks every run finds the same
+endpoints in the same order.
+
+Usage: python bench_scanner.py [--files 20000] [--workers 1,2,4,8] [--extract]
+"""
+import os
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+from app.agents.scanner import ProjectScanner
+
+ROUTE_TEMPLATE = """const express = require('express');
+const router = express.Router();
+const {{ validate }} = require('../middleware/validate');
+
+router.get('/api/{name}', async (req, res) => {{
+    const items = await db.collection('{name}').find().toArray();
+    res.json(items);
+}});
+
+router.post('/api/{name}', validate, async (req, res) => {{
+    const result = await db.collection('{name}').insertOne(req.body);
+    res.status(201).json(result);
+}});
+
+router.delete('/api/{name}/:id', async (req, res) => {{
+    await db.collection('{name}').deleteOne({{ _id: req.params.id }});
+    res.status(204).end();
+}});
+
+module.exports = router;
+"""
+
+UTIL_TEMPLATE = """// Helper module {index}
+function format{index}(value) {{
+    if (value === null || value === undefined) {{
+        return '';
+    }}
+    return String(value).trim().toLowerCase();
+}}
+
+module.exports = {{ format{index} }};
+""" + "// padding line to mimic real source size\n" * 60
+
+def build_project(zip_path: str, file_count: int):
+    """Writes a ZIP with one route file per 10 files; the rest are plain helpers."""
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr("bench_app/server.js", "const app = require('express')();\napp.get('/health', (req, res) => res.send('ok'));\n")
+        for i in range(file_count - 1):
+            if i % 10 == 0:
+                zipf.writestr(f"bench_app/src/routes/resource_{i}.js", ROUTE_TEMPLATE.format(name=f"resource_{i}"))
+            else:
+                zipf.writestr(f"bench_app/src/utils/{i % 50}/helper_{i}.js", UTIL_TEMPLATE.format(index=i))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel endpoint scanning")
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--extract", action="store_true", help="Benchmark the extract-and-walk mode instead of in-place")
+    args = parser.parse_args()
+
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    work_dir = tempfile.mkdtemp(prefix="scan_bench_")
+
+    try:
+        zip_path = os.path.join(work_dir, "bench_app.zip")
+        print(f"Building synthetic Express project with {args.files} files...")
+        build_project(zip_path, args.files)
+        print(f"Archive size: {os.path.getsize(zip_path) / 1e6:.1f} MB, CPUs available: {os.cpu_count()}\n")
+
+        baseline = None
+        reference = None
+        print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'endpoints':>10}")
+        for workers in worker_counts:
+            scanner = ProjectScanner(workers=workers, parallel_min_files=0)
+            extract_dir = os.path.join(work_dir, f"extracted_{workers}")
+
+            # Silence per-scan logging so it doesn't skew timings
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, "w")
+            try:
+                start = time.perf_counter()
+                endpoints = scanner.scan_project(zip_path, extract_dir, in_place=not args.extract)
+                elapsed = time.perf_counter() - start
+            finally:
+                scanner.shutdown()
+                sys.stdout.close()
+                sys.stdout = stdout
+
+            if baseline is None:
+                baseline = elapsed
+            # Compare on archive-relative paths since each run uses its own extract dir
+            normalized = [(ep["method"], ep["path"], os.path.relpath(ep["source_file"], extract_dir)) for ep in endpoints]
+            if reference is None:
+                reference = normalized
+            elif normalized != reference:
+                print(f"ERROR: results with {workers} workers differ from the first run")
+                sys.exit(1)
+
+            print(f"{workers:>8} {elapsed:>9.3f} {baseline / elapsed:>7.2f}x {len(endpoints):>10}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import io
+import os
+import gzip
+import pytest
+from app import artifact_store as artifact_store_module
+from app.artifact_store import ArtifactStore, parse_range
+
+def test_run_artifacts_stored_compressed_and_read_by_range(tmp_path):
+    store = ArtifactStore(root=str(tmp_path), max_runs=2)
+    report = tmp_path / "report.xml"
+    report.write_text("<testsuite/>")
+    logs = "".join(f"line {i}\n" for i in range(20000))
+    results = {
+        "status": "failure",
+        "summary": {"passed": 1, "failed": 1, "error": 0, "total": 2},
+        "reward": -4.0,
+        "logs": logs,
+        "failures": [{"nodeid": "test_x", "longrepr": "Traceback..." * 100}],
+        "test_file": "tests/test_api.py",
+    }
+
+    ref = store.save_run("u1", results, str(report))
+
+    # The reference kept in session state carries no bulky fields
+    assert "logs" not in ref and "failures" not in ref
+    assert ref["failure_count"] == 1 and ref["log_bytes"] == len(logs)
+    run_dir = store.run_dir("u1", ref["run_id"])
+    assert os.path.getsize(os.path.join(run_dir, "logs.txt.gz")) < len(logs) // 4
+    assert store.report_path("u1", ref["run_id"])
+
+    assert b"".join(store.iter_logs("u1", ref["run_id"])).decode() == logs
+    assert b"".join(store.iter_logs("u1", ref["run_id"], 7, 13)).decode() == logs[7:14]
+    assert store.load_failures("u1", ref["run_id"]) == results["failures"]
+
+    # Only the newest runs are kept, and malformed IDs never resolve to a folder
+    store.save_run("u1", results)
+    store.save_run("u1", results)
+    assert len(store.list_runs("u1")) == 2
+    assert store.load_meta("u1", "../../etc") is None
+
+def test_log_ranges_start_at_the_piece_holding_them(tmp_path, monkeypatch):
+    store = ArtifactStore(root=str(tmp_path), log_chunk_bytes=1000)
+    logs = "".join(f"line {i}\n" for i in range(20000))
+    ref = store.save_run("u1", {"logs": logs})
+    run_dir = store.run_dir("u1", ref["run_id"])
+
+    # Still a single ordinary gzip file
+    with gzip.open(os.path.join(run_dir, "logs.txt.gz"), "rb") as f:
+        assert f.read().decode() == logs
+    for start, end in [(0, 999), (999, 1000), (12_345, 12_999), (len(logs) - 5, len(logs) - 1)]:
+        assert b"".join(store.iter_logs("u1", ref["run_id"], start, end)).decode() == logs[start:end + 1]
+
+    # Reading the tail only touches the last piece of the compressed file
+    read = []
+    class CountingFile(io.BytesIO):
+        def read(self, size=-1):
+            data = super().read(size)
+            read.append(len(data))
+            return data
+    def counting_open(path, mode="r", *args, **kwargs):
+        if mode == "rb":
+            with open(path, "rb") as f:
+                return CountingFile(f.read())
+        return open(path, mode, *args, **kwargs)
+    monkeypatch.setattr(artifact_store_module, "open", counting_open, raising=False)
+    assert b"".join(store.iter_logs("u1", ref["run_id"], len(logs) - 10, len(logs) - 1)).decode() == logs[-10:]
+    assert 0 < sum(read) < os.path.getsize(os.path.join(run_dir, "logs.txt.gz")) // 50
+    monkeypatch.undo()
+
+    # Runs saved before logs were split are still readable
+    os.remove(os.path.join(run_dir, "logs.idx.json"))
+    assert b"".join(store.iter_logs("u1", ref["run_id"], 12_345, 12_999)).decode() == logs[12_345:13_000]
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
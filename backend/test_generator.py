@@ -0,0 +1,423 @@
+import os
+import re
+import ast
+import asyncio
+import json
+import threading
+import pytest
+from importlib.metadata import EntryPoint
+from app.agents import generator as generator_module
+from app.agents import executor as executor_module
+from app.agents.suite_merger import merge_test_modules
+from app.agents.llm_client import GeminiClient
+from app.agents.llm_cache import LLMCache
+from app.agents.rate_limiter import RateLimiter, TokenBucket
+from app.agents import healer as healer_module
+from app.agents.prompt_budget import endpoint_table, trim_text, window_around, estimate_tokens
+from app.agents import test_validator
+from app.agents.test_validator import validate_test_code
+from app.agents.test_templates import use_template, concrete_path, render_test_module
+
+class FakeClient:
+    """Answers each batch prompt with a module whose names collide across batches."""
+    def __init__(self, fail_on: str = None):
+        self.fail_on = fail_on
+        self.calls = 0
+        self.use_cache = []
+        self.lock = threading.Lock()
+
+    def forget(self, prompt: str):
+        pass
+
+    def generate_content(self, prompt: str, **kwargs) -> str:
+        with self.lock:
+            self.calls += 1
+            self.use_cache.append(kwargs.get("use_cache", True))
+        if self.fail_on and self.fail_on in prompt:
+            raise RuntimeError("upstream timeout")
+        paths = re.findall(r"^\d+\. [A-Z]+ (/\S*)", prompt, re.M)
+        tests = "\n".join(
+            f"def test_endpoint_{i}(base_url, client):\n    assert helper('{p}')\n" for i, p in enumerate(paths)
+        )
+        return f"""```python
+import pytest
+import requests
+
+@pytest.fixture
+def base_url():
+    return "http://elsewhere"
+
+@pytest.fixture
+def client():
+    return requests.Session()
+
+def helper(path):
+    return path
+
+{tests}
+```"""
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr("app.agents.llm_cache._cache", LLMCache(path=str(tmp_path / "llm_cache.db")))
+    monkeypatch.setattr("app.agents.llm_client._client", None)
+    # Imported through the module so pytest doesn't try to collect TestGenerator as a test class
+    return generator_module.TestGenerator(test_output_dir=str(tmp_path), batch_size=3, concurrency=3,
+                                          template_policy="never")
+
+def endpoints():
+    eps = [{"method": "GET", "path": f"/api/users/{i}", "source_file": "routes/users.js"} for i in range(4)]
+    eps += [{"method": "POST", "path": f"/api/orders/{i}", "source_file": "routes/orders.js"} for i in range(2)]
+    eps += [{"method": "GET", "path": "/health"}]
+    return eps
+
+def test_batches_group_by_source_and_merge_into_one_suite(generator):
+    generator.client = FakeClient()
+    path = generator.generate_test_suite("demo", endpoints(), "http://localhost:9000")
+    code = open(path).read()
+    tree = ast.parse(code)
+
+    names = [n.name for n in tree.body if isinstance(n, ast.FunctionDef)]
+    assert len(names) == len(set(names))
+    assert names.count("base_url") == 1 and "http://localhost:9000" in code
+    assert sum(name.startswith("test_") for name in names) == len(endpoints())
+    assert code.count("import requests") == 1
+    # Every batch's tests still call their own (renamed) helper and fixture
+    assert "helper_2(" in code and "client_2" in code
+    # orders.js, users.js split in two (batch size 3), and the /health resource
+    assert generator.client.calls == 4
+
+def test_failed_batch_only_loses_its_endpoints(generator):
+    generator.client = FakeClient(fail_on="/api/orders/")
+    code = open(generator.generate_test_suite("demo", endpoints())).read()
+    ast.parse(code)
+    assert "Generation failed" in code and "POST /api/orders/0" in code
+    assert "/api/users/3" in code and "/health" in code
+
+def test_merge_keeps_original_text_when_nothing_collides():
+    part = "import os\n\n# checks the root\ndef test_root(base_url):\n    assert True  # keep me\n"
+    merged = merge_test_modules([{"label": "root.js", "code": part}], "http://x")
+    assert "# checks the root\ndef test_root(base_url):\n    assert True  # keep me" in merged
+
+def test_llm_cache_hits_bypass_and_eviction(tmp_path, monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr("app.agents.llm_cache._cache", LLMCache(path=str(tmp_path / "shared.db")))
+
+    class FakeModel:
+        calls = 0
+        async def generate_content_async(self, prompt):
+            FakeModel.calls += 1
+            return type("Response", (), {"text": f"answer {FakeModel.calls} to {prompt}"})()
+
+    client = GeminiClient(model_name="test-model")
+    client.model = FakeModel()
+    client.cache = LLMCache(path=str(tmp_path / "cache.db"), max_bytes=200, ttl_seconds=0)
+
+    first = client.generate_content("same prompt")
+    assert client.generate_content("same prompt") == first
+    assert client.generate_content("same prompt", use_cache=False) != first
+    assert FakeModel.calls == 2
+    assert client.cache.hits == 1 and client.cache.misses == 1
+
+    # Cap is 200 bytes: older entries give way to new ones
+    for i in range(10):
+        client.generate_content(f"prompt {i}")
+    stats = client.cache.stats()
+    assert stats["size_bytes"] <= 200 and stats["evictions"] > 0
+    assert client.cache.get("test-model", "prompt 9") is not None
+    # The running total follows replacements and deletes
+    client.cache.put("test-model", "prompt 9", "shorter")
+    client.cache.delete("test-model", "prompt 8")
+    conn = client.cache._connect()
+    assert client.cache.stats()["size_bytes"] == conn.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+
+    expiring = LLMCache(path=str(tmp_path / "ttl.db"), ttl_seconds=1)
+    expiring.put("m", "p", "r")
+    monkeypatch.setattr("app.agents.llm_cache.time.time", lambda: 10 ** 10)
+    assert expiring.get("m", "p") is None
+
+def test_incremental_regeneration_only_touches_changed_sections(generator):
+    generator.client = FakeClient()
+    path = generator.generate_test_suite("demo", endpoints())
+
+    # A healed section must survive regeneration untouched
+    with open(path) as f:
+        code = f.read()
+    code = code.replace("('/api/orders/0')", "('/api/orders/0')  # healed")
+    with open(path, "w") as f:
+        f.write(code)
+
+    changed = endpoints()
+    changed[0]["payload_schema"] = {"name": "string"}     # users.js [1/2] changes
+    changed = [ep for ep in changed if ep["path"] != "/health"]   # /health removed
+    generator.client = FakeClient()
+    generator.generate_test_suite("demo", changed)
+    with open(path) as f:
+        updated = f.read()
+
+    assert generator.client.calls == 1
+    assert "# healed" in updated and "/health" not in updated
+    old_orders = code.split("# --- section: orders.js ---")[1].split("# --- section:")[0]
+    assert old_orders in updated
+    ast.parse(updated)
+
+    # Nothing changed: no LLM calls at all and an identical file
+    generator.client = FakeClient()
+    generator.generate_test_suite("demo", changed)
+    assert generator.client.calls == 0
+    with open(path) as f:
+        assert f.read() == updated
+
+def test_full_regeneration_bypasses_the_llm_cache(generator):
+    generator.client = FakeClient()
+    generator.generate_test_suite("demo", endpoints())
+    assert generator.client.use_cache == [True] * 4
+
+    generator.client = FakeClient()
+    generator.generate_test_suite("demo", endpoints(), incremental=False, use_cache=False)
+    assert generator.client.use_cache == [False] * 4
+
+def test_templates_cover_trivial_endpoints_without_the_llm(generator):
+    assert concrete_path("/users/:userId/posts/{slug}/<int:n>") == "/users/1/posts/test/1"
+    assert use_template({"method": "GET", "path": "/api/users"}, "auto")
+    assert use_template({"method": "GET", "path": "/api/health"}, "auto")
+    assert not use_template({"method": "GET", "path": "/api/users/:id", "payload_schema": {}}, "auto")
+    assert not use_template({"method": "DELETE", "path": "/api/users"}, "auto")
+    assert not use_template({"method": "POST", "path": "/api/orders", "payload_schema": {"qty": "int"}}, "auto")
+    module = render_test_module([{"method": "PUT", "path": "/items/{id}", "payload_schema": {"qty": "integer"}}])
+    assert "f\"{base_url}/items/1\"" in module and "json={'qty': 1}" in module
+    ast.parse(module)
+
+    generator.template_policy = "auto"
+    generator.client = FakeClient()
+    path = generator.generate_test_suite("demo", endpoints())
+    with open(path) as f:
+        code = f.read()
+    ast.parse(code)
+    # Only the POST /api/orders batch needed the LLM
+    assert generator.client.calls == 1
+    assert "# --- section: users.js (templates) ---" in code
+    assert "def test_get_health(base_url)" in code and "def test_get_api_users_3(base_url)" in code
+
+    generator.client = FakeClient()
+    generator.generate_test_suite("demo", endpoints())
+    assert generator.client.calls == 0
+
+def test_templates_that_fail_validation_go_to_the_llm(generator, monkeypatch):
+    monkeypatch.setattr(generator_module, "render_test_module", lambda eps: "def test_broken(:\n    pass\n")
+    generator.template_policy = "auto"
+    generator.client = FakeClient()
+    path = generator.generate_test_suite("demo", endpoints())
+    with open(path) as f:
+        code = f.read()
+    ast.parse(code)
+    assert "test_broken" not in code
+    # users.js and /health are generated by the LLM as well as orders.js
+    assert generator.client.calls == 3
+
+class StreamingModel:
+    """Streams its answer in three chunks, like genai's stream=True responses."""
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        Chunk = lambda t: type("Chunk", (), {"text": t})()
+        third = len(self.text) // 3
+        pieces = [self.text[:third], self.text[third:2 * third], self.text[2 * third:]]
+
+        async def chunks():
+            for p in pieces:
+                yield Chunk(p)
+        return chunks() if stream else Chunk(self.text)
+
+def test_streamed_generation_and_sse_endpoint(generator, tmp_path, monkeypatch):
+    code = ("import pytest\nimport requests\n\n@pytest.fixture\ndef base_url():\n    return 'http://x'\n\n"
+            "def test_ok(base_url):\n    assert True\n")
+    client = GeminiClient(model_name="test-model")
+    client.model = StreamingModel(f"```python\n{code}```")
+    generator.client = client
+
+    chunks = []
+    path = generator.generate_test_suite("demo", endpoints()[:2], on_chunk=lambda text, label: chunks.append((label, text)))
+    assert len(chunks) == 3 and {label for label, _ in chunks} == {"users.js"}
+    assert "def test_ok(base_url)" in open(path).read()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    # The streamed answer was cached, and a cache hit streams as one chunk
+    assert client.cache.stats()["entries"] == 1
+    assert len(list(client.generate_content_stream("prompt"))) == 3
+    assert list(client.generate_content_stream("prompt")) == [client.model.text]
+
+    from fastapi.testclient import TestClient
+    from app import main
+    test_file = tmp_path / "test_heal.py"
+    test_file.write_text("def test_x():\n    assert False\n")
+    monkeypatch.setattr(main.healer, "client", client)
+    client.model = StreamingModel(code)
+    with TestClient(main.app) as http:
+        response = http.post("/heal-test/stream", json={"test_file": str(test_file), "failure_logs": "[]"},
+                             headers={"X-User-Id": "stream-user"})
+    events = [block.split("\n", 1) for block in response.text.strip().split("\n\n")]
+    assert [e[0] for e in events] == ["event: chunk"] * 3 + ["event: completed"]
+    assert "".join(json.loads(e[1][len("data: "):])["text"] for e in events[:3]) == code
+    assert json.loads(events[-1][1][len("data: "):])["status"] == "healed"
+    assert test_file.read_text() == code.strip()
+
+def test_prompt_budget_trims_inputs_and_heals_only_failing_sections(generator, tmp_path, monkeypatch):
+    assert endpoint_table([{"method": "POST", "path": "/a", "payload_schema": {"n": "int"}},
+                           {"method": "GET", "path": "/b"}]) == '1. POST /a {"n":"int"}\n2. GET /b -'
+    text = "\n".join(f"line {i}" for i in range(1000))
+    trimmed = trim_text(text, 100)
+    assert estimate_tokens(trimmed) <= 100 and "line 0" in trimmed and "line 999" in trimmed and "omitted" in trimmed
+    around = window_around(text, [500], 50)
+    assert "line 499" in around and "line 0\n" not in around
+
+    # A suite too big for the budget: only the failing section goes to the LLM
+    generator.client = FakeClient()
+    generator.batch_size = 1
+    path = generator.generate_test_suite("demo", endpoints())
+    monkeypatch.setattr("app.agents.healer.PROMPT_TOKEN_BUDGET", 1250)
+    monkeypatch.setattr("app.agents.prompt_budget.PROMPT_TOKEN_BUDGET", 1250)
+    healer = healer_module.SelfHealingAgent()
+    prompts = []
+
+    class HealingClient:
+        def generate_content(self, prompt, on_chunk=None, use_cache=True):
+            prompts.append(prompt)
+            assert not use_cache
+            section = prompt.split("```python")[1].split("```")[0]
+            return section.replace("helper_3('/api/orders/1')", "helper_3('/api/orders/1')  # healed")
+
+    healer.client = HealingClient()
+    before = open(path).read()
+    assert estimate_tokens(before) > 250
+    result = healer.heal_test_case(path, '[{"nodeid": "test_endpoint_0_3"}]', use_cache=False)
+    assert result["status"] == "healed", result
+    after = open(path).read()
+    assert "/api/users/" not in prompts[0] and "# healed" in after
+    assert after.replace("  # healed", "") == before
+
+def test_fixtures_from_installed_plugins_are_known(tmp_path, monkeypatch):
+    (tmp_path / "fake_mock_plugin.py").write_text(
+        "import pytest\n\n@pytest.fixture\ndef mocker():\n    return object()\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    plugin = EntryPoint(name="mock", value="fake_mock_plugin", group="pytest11")
+    monkeypatch.setattr(test_validator, "entry_points", lambda group: [plugin])
+    test_validator.plugin_fixtures.cache_clear()
+    try:
+        assert validate_test_code("def test_patched(mocker):\n    pass\n")["valid"]
+        assert not validate_test_code("def test_patched(not_a_fixture):\n    pass\n")["valid"]
+    finally:
+        test_validator.plugin_fixtures.cache_clear()
+
+def test_validation_catches_broken_tests_and_repairs_once(generator, tmp_path):
+    assert "SyntaxError" in validate_test_code("def test_x(:\n    pass\n")["errors"][0]
+    report = validate_test_code(
+        "import not_a_real_module\n\ndef test_a(base_url):\n    pass\n\ndef test_a():\n    pass\n")
+    assert not report["valid"] and len(report["errors"]) == 3
+    assert validate_test_code("import pytest\n\n@pytest.mark.parametrize('n', [1])\n"
+                              "def test_n(n, tmp_path):\n    pass\n")["valid"]
+
+    class RepairingClient(FakeClient):
+        """Drops the helper the tests call a fixture of, until asked for a repair."""
+        def generate_content(self, prompt, **kwargs):
+            if "fails validation" in prompt:
+                self.calls += 1
+                return self.original
+            self.original = super().generate_content(prompt)
+            return self.original.replace("def client():", "def other():")
+
+    generator.client = RepairingClient()
+    code = open(generator.generate_test_suite("demo", endpoints()[4:6])).read()
+    assert generator.client.calls == 2 and "def client" in code
+
+    broken = tmp_path / "test_broken.py"
+    broken.write_text("def test_x(:\n    pass\n")
+    result = executor_module.TestExecutor().run_test_suite(str(broken))
+    assert result["status"] == "error" and result["summary"]["error"] == 1
+    assert "SyntaxError" in result["failures"][0]["message"]
+
+def test_shared_client_queues_calls_and_backs_off_without_blocking(tmp_path, monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr("app.agents.llm_cache._cache", None)
+    monkeypatch.setattr("app.agents.llm_cache.LLM_CACHE_ENABLED", False)
+
+    class BusyModel:
+        """Takes 50ms per call, and answers the first two calls with a 429."""
+        def __init__(self):
+            self.active = self.peak = self.calls = 0
+
+        async def generate_content_async(self, prompt):
+            self.calls += 1
+            if self.calls <= 2:
+                raise RuntimeError("429 Resource has been exhausted")
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.05)
+            self.active -= 1
+            return type("Response", (), {"text": f"answer to {prompt}"})()
+
+    client = GeminiClient(model_name="test-model")
+    client.model = BusyModel()
+    client.limiter = RateLimiter(rpm=6000, tpm=10 ** 7, max_concurrency=2)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.update({i: client.generate_content(f"p{i}", base_delay=0.01)}))
+               for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert results == {i: f"answer to p{i}" for i in range(6)}
+    assert client.model.peak == 2 and client.limiter.throttled == 2
+    assert client.limiter.stats()["in_flight"] == 0
+
+    # A bucket of 60 requests a minute lets one more through every second
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(1, bucket.updated) == pytest.approx(1.0)
+
+def test_identical_calls_in_flight_share_one_request(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr("app.agents.llm_cache.LLM_CACHE_ENABLED", False)
+    client = GeminiClient(model_name="test-model")
+    client.model = StreamingModel("def test_x():\n    assert True\n")
+    slow = client.model.generate_content_async
+
+    async def slow_call(prompt, stream=False):
+        await asyncio.sleep(0.1)
+        return await slow(prompt, stream=stream)
+    client.model.generate_content_async = slow_call
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.generate_content("same prompt"))) for _ in range(4)]
+    threads.append(threading.Thread(target=lambda: results.append("".join(client.generate_content_stream("same prompt")))))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert results == [client.model.text] * 5
+    assert client.model.calls == 1 and client.coalesced_calls == 4
+    assert client.stats()["requests_in_flight"] == 0
+
+    # Once it has finished, the same prompt is a new request
+    client.generate_content("same prompt")
+    assert client.model.calls == 2
+
+def test_answers_that_fail_validation_are_not_served_from_cache(generator):
+    class BrokenModel:
+        calls = 0
+        async def generate_content_async(self, prompt):
+            BrokenModel.calls += 1
+            return type("Response", (), {"text": "def test_x(:\n    pass\n"})()
+
+    client = GeminiClient(model_name="test-model")
+    client.model = BrokenModel()
+    generator.client = client
+    assert generator.generate_test_suite("demo", endpoints()[4:6]) == ""
+    assert BrokenModel.calls == 2   # the answer and one repair
+
+    # Neither the broken answer nor the failed repair comes back from the cache
+    assert generator.generate_test_suite("demo", endpoints()[4:6]) == ""
+    assert BrokenModel.calls == 4
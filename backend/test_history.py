@@ -0,0 +1,83 @@
+import json
+import threading
+import pytest
+from app.run_history import RunHistory
+from app.history_db import HistoryDB, HistoryCursorError
+
+def _legacy_log(root, user_id, entries):
+    user_dir = root / user_id
+    user_dir.mkdir(exist_ok=True)
+    (user_dir / "run_history.json").write_text(json.dumps(entries))
+
+def test_legacy_run_history_is_read_oldest_first(tmp_path):
+    history = RunHistory(root=str(tmp_path))
+    assert history.entries("nobody") == []
+    _legacy_log(tmp_path, "u1", [{"timestamp": "2024-01-02"}, {"timestamp": "2024-01-01"}])
+    assert [e["timestamp"] for e in history.entries("u1")] == ["2024-01-01", "2024-01-02"]
+    # An unreadable file imports nothing rather than failing
+    (tmp_path / "u2").mkdir()
+    (tmp_path / "u2" / "run_history.json").write_text('[{"timestamp": "2025-01')
+    assert history.entries("u2") == []
+
+def test_history_db_filters_pages_and_aggregates(tmp_path):
+    # File-based history is imported on first use
+    _legacy_log(tmp_path, "u1", [{
+        "timestamp": "2025-01-01T10:00:00", "project_name": "old", "status": "failed", "reward": -5.0,
+        "summary": {"passed": 0, "failed": 1, "error": 0, "total": 1}
+    }])
+    db = HistoryDB(path=str(tmp_path / "history.db"), legacy_root=str(tmp_path))
+    for day in range(2, 8):
+        db.record_run("u1", {
+            "timestamp": f"2025-01-0{day}T10:00:00", "project_name": "api", "reward": float(day),
+            "status": "passed" if day % 2 == 0 else "failed",
+            "summary": {"passed": 2, "failed": day % 2, "error": 0, "total": 2 + day % 2}
+        })
+    db.record_run("u2", {"timestamp": "2025-01-03T10:00:00", "project_name": "other", "status": "passed"})
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = db.query_runs("u1", project="api", cursor=cursor, limit=4)
+        pages.append([e["timestamp"][:10] for e in page])
+        if not cursor:
+            break
+    assert pages == [["2025-01-07", "2025-01-06", "2025-01-05", "2025-01-04"], ["2025-01-03", "2025-01-02"]]
+    with pytest.raises(HistoryCursorError):
+        db.query_runs("u1", cursor="not-a-cursor")
+
+    passed, _ = db.query_runs("u1", status="passed", since="2025-01-03", until="2025-01-06")
+    assert [e["timestamp"][:10] for e in passed] == ["2025-01-06", "2025-01-04"]
+
+    assert db.stats("u1") == {"total_runs": 7, "passed_runs": 3, "avg_reward": pytest.approx(22 / 7), "active_projects": 2}
+    trends = db.trends("u1", "day", project="api")
+    assert [t["pass_rate"] for t in trends] == [1, 0, 1, 0, 1, 0]
+    assert db.trends("u1", "month")[0]["runs"] == 7
+
+    # Counters rebuilt from the runs table match the incrementally maintained ones
+    before = db.stats("u1")
+    db.rebuild_stats()
+    assert db.stats("u1") == before and db.stats("u2")["total_runs"] == 1
+
+def test_history_db_imports_legacy_log_once_across_workers(tmp_path):
+    _legacy_log(tmp_path, "u1", [{"timestamp": f"2025-01-01T00:00:{n:02d}", "status": "passed"} for n in range(50)])
+    # Separate instances stand in for worker processes sharing the database
+    workers = [HistoryDB(path=str(tmp_path / "history.db"), legacy_root=str(tmp_path)) for _ in range(4)]
+    threads = [threading.Thread(target=db.stats, args=("u1",)) for db in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert workers[0].stats("u1")["total_runs"] == 50
+    runs, _ = workers[0].query_runs("u1", limit=100)
+    assert len(runs) == 50
+
+def test_history_db_keeps_newest_runs_per_user(tmp_path):
+    db = HistoryDB(path=str(tmp_path / "history.db"), legacy_root=str(tmp_path), max_runs=3)
+    for n in range(7):
+        db.record_run("u1", {"timestamp": f"2025-01-01T00:00:{n:02d}", "status": "passed", "reward": float(n)})
+    db.record_run("u2", {"timestamp": "2025-01-01T00:00:00", "status": "passed"})
+
+    # Pruned once the user passed twice the limit, and the counters follow
+    runs, _ = db.query_runs("u1")
+    assert [r["timestamp"][-2:] for r in runs] == ["06", "05", "04"]
+    assert db.stats("u1")["total_runs"] == 3 and db.stats("u1")["avg_reward"] == 5
+    assert db.stats("u2")["total_runs"] == 1
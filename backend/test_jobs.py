@@ -0,0 +1,101 @@
+import os
+import time
+import threading
+from app import jobs as jobs_module
+from app.jobs import JobManager
+
+def _wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_submit_reports_progress_and_result(tmp_path):
+    jobs = JobManager(max_workers=1, jobs_dir=str(tmp_path))
+
+    def work(n, progress_callback):
+        for i in range(n):
+            progress_callback("scan", i + 1, n)
+        return {"endpoints_found": n}
+
+    job = jobs.submit("alice", "upload", work, 3)
+    _wait_for(lambda: job.finished)
+    assert jobs.get(job.id, "alice").to_dict()["result"] == {"endpoints_found": 3}
+    assert job.status == "completed" and job.progress == {"stage": "scan", "done": 3, "total": 3}
+    assert jobs.get(job.id, "bob") is None
+    jobs.shutdown()
+
+def test_status_is_visible_from_other_workers(tmp_path):
+    owner = JobManager(max_workers=1, jobs_dir=str(tmp_path))
+    other = JobManager(max_workers=1, jobs_dir=str(tmp_path))
+    release = threading.Event()
+
+    def work(progress_callback):
+        progress_callback("clone", 0, 1)
+        release.wait(5)
+        return {"ok": True}
+
+    job = owner.submit("alice", "process-github", work)
+    _wait_for(lambda: other.get(job.id, "alice").status == "running")
+    assert other.get(job.id, "bob") is None
+    assert other.get("../../etc/passwd", "alice") is None
+
+    release.set()
+    _wait_for(lambda: other.get(job.id, "alice").finished)
+    assert other.get(job.id, "alice").result == {"ok": True}
+    owner.shutdown()
+    other.shutdown()
+
+def test_cancel_running_and_queued_jobs(tmp_path):
+    owner = JobManager(max_workers=1, jobs_dir=str(tmp_path))
+    other = JobManager(max_workers=1, jobs_dir=str(tmp_path))
+    calls = []
+
+    def work(progress_callback):
+        calls.append("started")
+        while True:
+            progress_callback("scan", 0, 1)
+            time.sleep(0.01)
+
+    running = owner.submit("alice", "upload", work)
+    queued = owner.submit("alice", "upload", work)
+    _wait_for(lambda: running.status == "running")
+
+    assert owner.cancel(queued.id, "alice").status == "cancelled"
+    assert owner.cancel(running.id, "bob") is None
+    # Cancelled from another worker: picked up at the next persisted progress update
+    other.cancel(running.id, "alice")
+    _wait_for(lambda: running.finished)
+    assert running.status == "cancelled"
+    _wait_for(lambda: other.get(running.id, "alice").status == "cancelled")
+    time.sleep(0.05)
+    assert calls == ["started"]
+    owner.shutdown()
+    other.shutdown()
+
+def test_only_finished_jobs_expire(tmp_path, monkeypatch):
+    jobs = JobManager(max_workers=2, jobs_dir=str(tmp_path))
+    release = threading.Event()
+
+    def slow(progress_callback):
+        progress_callback("scan", 0, 1)
+        release.wait(5)
+        return {}
+
+    running = jobs.submit("alice", "upload", slow)
+    done = jobs.submit("alice", "upload", lambda progress_callback: {})
+    _wait_for(lambda: running.status == "running" and done.finished)
+    # Both files are past the TTL: the running job just hasn't reported progress lately
+    monkeypatch.setattr(jobs_module, "JOB_TTL_SECONDS", 0)
+    for job in (running, done):
+        path = jobs._path(job.id)
+        os.utime(path, (time.time() - 10, time.time() - 10))
+    done.updated_at -= 10
+
+    jobs._purge_expired()
+    assert os.path.exists(jobs._path(running.id)) and not os.path.exists(jobs._path(done.id))
+    assert jobs.get(running.id, "alice") is running and jobs.get(done.id, "alice") is None
+
+    release.set()
+    _wait_for(lambda: running.finished)
+    jobs.shutdown()
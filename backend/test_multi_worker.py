@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import multiprocessing
+from collections import Counter
+from app.session_store import SessionStore
+from app.user_locks import UserLocks
+from app.history_db import HistoryDB
+from app.agents.rl_engine import RLEngine
+
+WORKERS = 4
+USERS = 6
+REQUESTS_PER_WORKER = 15
+ENDPOINTS = ["/api/users", "/api/orders", "/api/items"]
+
+def worker(root: str, worker_id: int):
+    """
+    Plays one uvicorn worker process: every worker serves requests for every
+    user, so the same user's requests land on different processes at once.
+    """
+    sessions = SessionStore(lambda user_id: os.path.join(root, "sessions", user_id, "system_state.json"))
+    locks = UserLocks(lock_dir=os.path.join(root, "locks"),
+                      on_acquire=sessions.revalidate, on_release=sessions.flush)
+    history = HistoryDB(path=os.path.join(root, "history.db"), legacy_root=os.path.join(root, "users"))
+    rl = RLEngine(storage_path=os.path.join(root, "q_table.db"), legacy_path=os.path.join(root, "q_table.json"))
+
+    for n in range(REQUESTS_PER_WORKER):
+        user_id = f"user-{(n + worker_id) % USERS}"
+        with locks.hold_sync(user_id):
+            state = sessions.get(user_id)
+            state["requests"] = state.get("requests", 0) + 1
+            sessions.put(user_id, state)
+        history.record_run(user_id, {"timestamp": f"2025-01-01T00:00:{n:02d}", "project_name": user_id,
+                                     "status": "passed", "reward": 1.0})
+        rl.update_policies(ENDPOINTS, "standard", 1.0)
+    sessions.close()
+
+def test_parallel_users_across_worker_processes(tmp_path):
+    root = str(tmp_path)
+    # Create the databases once so workers don't race on schema setup
+    HistoryDB(path=os.path.join(root, "history.db"), legacy_root=os.path.join(root, "users"))
+    RLEngine(storage_path=os.path.join(root, "q_table.db"), legacy_path=os.path.join(root, "q_table.json"))
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=worker, args=(root, i)) for i in range(WORKERS)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(120)
+        assert p.exitcode == 0
+
+    total = REQUESTS_PER_WORKER * WORKERS
+    expected = Counter(f"user-{(n + w) % USERS}" for w in range(WORKERS) for n in range(REQUESTS_PER_WORKER))
+
+    # No session update was lost, even though each user was served by every worker
+    sessions = SessionStore(lambda user_id: os.path.join(root, "sessions", user_id, "system_state.json"))
+    assert {f"user-{u}": sessions.get(f"user-{u}").get("requests", 0) for u in range(USERS)} == expected
+
+    history = HistoryDB(path=os.path.join(root, "history.db"), legacy_root=os.path.join(root, "users"))
+    assert sum(history.stats(f"user-{u}")["total_runs"] for u in range(USERS)) == total
+
+    with sqlite3.connect(os.path.join(root, "q_table.db")) as conn:
+        updates = dict(conn.execute("SELECT state, updates FROM q_values WHERE action = 'standard'").fetchall())
+    assert updates == {endpoint: total for endpoint in ENDPOINTS}
@@ -0,0 +1,218 @@
+import os
+import zipfile
+import pytest
+from app.agents.scanner import ProjectScanner, ZipLimitError
+from app.agents.route_detectors import detect_routes, DETECTORS
+
+SERVER_JS = """
+const express = require('express');
+const app = express();
+
+app.get('/api/users', (req, res) => res.json([]));
+app.post('/api/users', (req, res) => res.status(201).send('Created'));
+"""
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for name, content in members.items():
+            zipf.writestr(name, content)
+    return str(path)
+
+@pytest.fixture
+def project_zip(tmp_path):
+    return make_zip(tmp_path / "shop.zip", {
+        "server.js": SERVER_JS,
+        "node_modules/express/index.js": "router.get('/hidden', fn)",
+        "assets/logo.png": b"\x89PNG",
+    })
+
+def test_in_place_scan_does_not_extract(tmp_path, project_zip):
+    extract_dir = str(tmp_path / "extracted")
+    scanner = ProjectScanner()
+
+    endpoints = scanner.scan_project(project_zip, extract_dir)
+
+    assert [(ep["method"], ep["path"]) for ep in endpoints] == [("GET", "/api/users"), ("POST", "/api/users")]
+    assert not os.path.exists(extract_dir)
+    assert endpoints[0]["source_file"] == os.path.join(extract_dir, "shop", "server.js")
+
+def test_ensure_extracted_materializes_single_file(tmp_path, project_zip):
+    extract_dir = str(tmp_path / "extracted")
+    scanner = ProjectScanner()
+    source_file = scanner.scan_project(project_zip, extract_dir)[0]["source_file"]
+
+    assert scanner.ensure_extracted(project_zip, extract_dir, source_file) == source_file
+    with open(source_file) as f:
+        assert f.read() == SERVER_JS
+    assert os.listdir(os.path.join(extract_dir, "shop")) == ["server.js"]
+
+def test_ensure_extracted_rejects_paths_outside_project(tmp_path, project_zip):
+    extract_dir = str(tmp_path / "extracted")
+    outside = str(tmp_path / "server.js")
+
+    assert ProjectScanner().ensure_extracted(project_zip, extract_dir, outside) is None
+
+def test_extracting_scan_matches_in_place_scan(tmp_path, project_zip):
+    scanner = ProjectScanner()
+    in_place = scanner.scan_project(project_zip, str(tmp_path / "a"))
+    extracted = scanner.scan_project(project_zip, str(tmp_path / "a"), in_place=False)
+
+    assert in_place == extracted
+
+def test_parallel_scan_merges_in_serial_order(tmp_path):
+    members = {f"src/routes/r{i}.js": f"router.get('/api/r{i}', fn);\nrouter.post('/api/r{i}', fn);" for i in range(40)}
+    zip_path = make_zip(tmp_path / "many.zip", members)
+    extract_dir = str(tmp_path / "extracted")
+
+    serial = ProjectScanner(workers=1).scan_project(zip_path, extract_dir)
+    scanner = ProjectScanner(workers=2, chunk_size=3, parallel_min_files=0)
+    try:
+        parallel = scanner.scan_project(zip_path, extract_dir)
+        pool = scanner._pool
+        # Later scans, of either kind, reuse the same worker processes
+        extracted = ProjectScanner(workers=1).scan_project(zip_path, extract_dir, in_place=False)
+        assert scanner.scan_project(zip_path, extract_dir, in_place=False) == extracted
+        assert scanner._pool is pool
+        assert pool._mp_context.get_start_method() != "fork"
+    finally:
+        scanner.shutdown()
+
+    assert len(serial) == 80
+    assert parallel == serial
+    assert scanner._pool is None
+
+def test_incremental_rescan_reanalyzes_only_changed_files(tmp_path, monkeypatch):
+    index_path = str(tmp_path / "scan_index" / "shop.json")
+    extract_dir = str(tmp_path / "extracted")
+    scanner = ProjectScanner()
+    make_zip(tmp_path / "shop.zip", {"server.js": SERVER_JS, "routes/orders.js": "router.get('/orders', fn)", "routes/old.js": "router.get('/old', fn)"})
+    first = scanner.scan_project(str(tmp_path / "shop.zip"), extract_dir, index_path=index_path)
+    assert len(first) == 4
+
+    make_zip(tmp_path / "shop.zip", {"server.js": SERVER_JS, "routes/orders.js": "router.delete('/orders/:id', fn)", "routes/new.js": "router.put('/new', fn)"})
+    analyzed = []
+    original = ProjectScanner.analyze_file_static
+    def spy(self, content, filename):
+        analyzed.append(filename)
+        return original(self, content, filename)
+    monkeypatch.setattr(ProjectScanner, "analyze_file_static", spy)
+
+    second = scanner.scan_project(str(tmp_path / "shop.zip"), extract_dir, index_path=index_path)
+
+    assert sorted(analyzed) == ["new.js", "orders.js"]
+    assert [(ep["method"], ep["path"]) for ep in second] == [
+        ("GET", "/api/users"), ("POST", "/api/users"), ("DELETE", "/orders/:id"), ("PUT", "/new")
+    ]
+
+def test_unchanged_rescan_skips_analysis_in_extract_mode(tmp_path, monkeypatch, project_zip):
+    index_path = str(tmp_path / "index.json")
+    scanner = ProjectScanner()
+    first = scanner.scan_project(project_zip, str(tmp_path / "x"), in_place=False, index_path=index_path)
+
+    monkeypatch.setattr(ProjectScanner, "analyze_file_static", lambda *args: pytest.fail("file re-analyzed"))
+    assert scanner.scan_project(project_zip, str(tmp_path / "x"), in_place=False, index_path=index_path) == first
+
+def test_detectors_are_chosen_by_extension():
+    fastapi_source = "@app.get('/items')\ndef items(): pass\n"
+
+    # Python decorators are not reported twice, and JS detectors never see .py files
+    assert detect_routes(fastapi_source, "main.py") == [("GET", "/items")]
+    assert detect_routes("app.get('/items', h)", "main.py") == []
+    assert detect_routes("app.get('/items', h)", "notes.txt") == []
+    # Decorated Python without route calls never reaches the FastAPI regex
+    fastapi = next(d for d in DETECTORS['.py'] if d.name == "fastapi")
+    assert fastapi.might_match(fastapi_source)
+    assert not fastapi.might_match("@pytest.fixture\ndef client(): pass\n@dataclass\nclass A: pass\n")
+
+def test_flask_go_and_spring_routes():
+    flask = "@bp.route('/login', methods=['GET', 'POST'])\ndef login(): pass\n@bp.route('/me')\ndef me(): pass\n"
+    go = 'http.HandleFunc("/health", h)\nmux.HandleFunc("DELETE /items/{id}", h)\n'
+    spring = (
+        '@RestController\n@RequestMapping("/api/users")\npublic class Users {\n'
+        '    @GetMapping("/{id}")\n    public User one() {}\n'
+        '    @RequestMapping(value = "/bulk", method = RequestMethod.POST)\n    public void bulk() {}\n}\n'
+    )
+
+    assert detect_routes(flask, "auth.py") == [("GET", "/login"), ("POST", "/login"), ("GET", "/me")]
+    assert detect_routes(go, "main.go") == [("GET", "/health"), ("DELETE", "/items/{id}")]
+    assert detect_routes(spring, "Users.java") == [("GET", "/api/users/{id}"), ("POST", "/api/users/bulk")]
+
+def test_gitignore_size_and_binary_filters(tmp_path):
+    zip_path = make_zip(tmp_path / "app.zip", {
+        ".gitignore": "generated/\n*.min.js\n!keep.min.js\n/scripts\n",
+        "server.js": "app.get('/ok', h)",
+        "generated/routes.js": "app.get('/generated', h)",
+        "public/bundle.min.js": "app.get('/bundled', h)",
+        "public/keep.min.js": "app.get('/kept', h)",
+        "scripts/seed.js": "app.get('/seed', h)",
+        "src/scripts/admin.js": "app.get('/admin', h)",
+        "dist/server.js": "app.get('/dist', h)",
+        "api/.gitignore": "legacy.js\n",
+        "api/legacy.js": "router.get('/legacy', h)",
+        "api/blob.js": b"router.get('/blob', h)\x00\x01",
+        "api/huge.js": "router.get('/huge', h)\n" + "//" * 600,
+    })
+    scanner = ProjectScanner(max_file_bytes=1000)
+
+    for in_place in (True, False):
+        endpoints = scanner.scan_project(zip_path, str(tmp_path / "extracted"), in_place=in_place)
+        assert sorted(ep["path"] for ep in endpoints) == ["/admin", "/kept", "/ok"]
+
+def test_extraction_enforces_entry_ratio_and_byte_limits(tmp_path, project_zip):
+    extract_dir = str(tmp_path / "extracted")
+    scanner = ProjectScanner()
+
+    scanner.max_entries = 2
+    with pytest.raises(ZipLimitError):
+        scanner.extract_zip(project_zip, extract_dir)
+
+    bomb = make_zip(tmp_path / "bomb.zip", {"server.js": SERVER_JS, "padding.txt": "0" * 2_000_000})
+    scanner = ProjectScanner()
+    with pytest.raises(ZipLimitError, match="compression ratio"):
+        scanner.extract_zip(bomb, extract_dir)
+    assert not os.path.exists(os.path.join(extract_dir, "bomb"))
+
+    scanner.max_ratio = 10_000
+    scanner.max_total_bytes = 500_000
+    with pytest.raises(ZipLimitError):
+        scanner.extract_zip(bomb, extract_dir)
+
+def test_repetitive_source_files_are_not_mistaken_for_bombs(tmp_path):
+    # Well past ZIP_MAX_RATIO, but far too small to matter
+    server_js = SERVER_JS + "app.get('/api/ping', (req, res) => res.send('pong'));\n" * 2000
+    zip_path = make_zip(tmp_path / "shop.zip", {"server.js": server_js})
+    info = zipfile.ZipFile(zip_path).getinfo("server.js")
+    assert info.file_size / info.compress_size > ProjectScanner().max_ratio
+
+    for in_place in (True, False):
+        skipped = []
+        endpoints = ProjectScanner().scan_project(zip_path, str(tmp_path / "extracted"), in_place=in_place, skipped=skipped)
+        assert len(endpoints) == 2002 and skipped == []
+
+def test_in_place_scan_caps_bytes_and_reports_skipped_members(tmp_path, monkeypatch):
+    zip_path = make_zip(tmp_path / "shop.zip", {"server.js": SERVER_JS, "routes/dense.js": "router.get('/x', fn)\n" * 5000})
+    scanner = ProjectScanner()
+    index_path = str(tmp_path / "scan_index" / "shop.json")
+
+    scanner.ratio_min_bytes = 0
+    skipped = []
+    endpoints = scanner.scan_project(zip_path, str(tmp_path / "extracted"), index_path=index_path, skipped=skipped)
+    assert len(endpoints) == 2
+    assert [s["file"] for s in skipped] == ["routes/dense.js"]
+    assert "compression ratio" in skipped[0]["reason"]
+
+    # Skipped members stay out of the index and are retried on the next scan
+    scanner.ratio_min_bytes = 1024 * 1024
+    skipped = []
+    assert len(scanner.scan_project(zip_path, str(tmp_path / "extracted"), index_path=index_path, skipped=skipped)) == 5002
+    assert skipped == []
+
+    scanner.max_total_bytes = 50_000
+    with pytest.raises(ZipLimitError):
+        scanner.scan_project(zip_path, str(tmp_path / "extracted"))
+
+def test_extraction_reports_progress(tmp_path, project_zip):
+    progress = []
+    ProjectScanner().extract_zip(project_zip, str(tmp_path / "extracted"), progress_callback=lambda *p: progress.append(p))
+
+    assert progress == [("extract", 1, 3), ("extract", 2, 3), ("extract", 3, 3)]
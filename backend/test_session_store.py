@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import threading
+from app.session_store import SessionStore, write_json_atomic
+from app.user_locks import UserLocks
+
+def _state_path(root):
+    return lambda user_id: os.path.join(root, user_id, "system_state.json")
+
+def _read(path):
+    with open(path) as f:
+        return json.load(f)
+
+def test_changes_are_flushed_once_after_the_delay(tmp_path):
+    store = SessionStore(_state_path(str(tmp_path)), flush_delay=0.2)
+    path = _state_path(str(tmp_path))("alice")
+    state = store.get("alice")
+    for n in range(5):
+        state["n"] = n
+        store.put("alice", state)
+    # Nothing is written while the burst is still coming in
+    assert not os.path.exists(path)
+
+    deadline = time.monotonic() + 5
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline, "state was never flushed"
+        time.sleep(0.01)
+    assert _read(path)["n"] == 4
+    store.close()
+
+def test_interleaved_writers_lose_no_updates(tmp_path):
+    # Two stores stand in for two worker processes serving the same user
+    stores = [SessionStore(_state_path(str(tmp_path / "sessions")), flush_delay=10) for _ in range(2)]
+    locks = [UserLocks(lock_dir=str(tmp_path / "locks"), on_acquire=s.revalidate, on_release=s.flush) for s in stores]
+
+    def writer(store, lock):
+        for _ in range(50):
+            with lock.hold_sync("alice"):
+                state = store.get("alice")
+                state["count"] = state.get("count", 0) + 1
+                store.put("alice", state)
+
+    threads = [threading.Thread(target=writer, args=pair) for pair in zip(stores, locks)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert _read(_state_path(str(tmp_path / "sessions"))("alice"))["count"] == 100
+    for store in stores:
+        store.close()
+
+def test_reloads_after_the_file_changes_elsewhere(tmp_path):
+    store = SessionStore(_state_path(str(tmp_path)), flush_delay=10)
+    path = _state_path(str(tmp_path))("alice")
+    assert store.get("alice")["project_name"] is None
+
+    write_json_atomic(path, {"project_name": "changed-elsewhere.zip"})
+    # Served from memory until revalidated
+    assert store.get("alice")["project_name"] is None
+    store.revalidate("alice")
+    assert store.get("alice")["project_name"] == "changed-elsewhere.zip"
+
+    # Unflushed local changes win over the file
+    store.put("alice", {"project_name": "local.zip"})
+    write_json_atomic(path, {"project_name": "changed-again.zip"})
+    store.revalidate("alice")
+    assert store.get("alice")["project_name"] == "local.zip"
+    store.close()
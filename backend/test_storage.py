@@ -0,0 +1,122 @@
+import os
+from app import reaper as reaper_module
+from app.blob_store import BlobStore
+from app.reaper import StorageReaper
+from app.user_locks import UserLocks
+
+def _store(store: BlobStore, data: bytes, owner: str = None) -> str:
+    writer = store.new_writer()
+    writer.write(data)
+    return writer.commit(owner)
+
+def _session_link(root, store: BlobStore, content_hash: str, user_id: str) -> str:
+    uploads = os.path.join(root, "sessions", user_id, "uploads")
+    os.makedirs(uploads, exist_ok=True)
+    link = os.path.join(uploads, "project.zip")
+    store.link_into(content_hash, link)
+    return link
+
+def test_identical_uploads_share_one_blob(tmp_path):
+    store = BlobStore(str(tmp_path / "cas"))
+    first = _store(store, b"same bytes", "alice")
+    second = _store(store, b"same bytes", "bob")
+    other = _store(store, b"other bytes", "alice")
+
+    assert first == second != other
+    assert sorted(store.refs(first)) == ["alice", "bob"]
+    assert os.listdir(store.tmp_dir) == []
+    with open(store.blob_path(first), "rb") as f:
+        assert f.read() == b"same bytes"
+
+    store.release(first, "alice")
+    store.release(first, "alice")
+    assert store.refs(first) == ["bob"]
+
+def test_reaper_keeps_referenced_blobs_even_when_links_are_copies(tmp_path, monkeypatch):
+    storage = tmp_path / "storage"
+    store = BlobStore(str(storage / "cas"))
+    reaper = StorageReaper(str(storage), budget_bytes=0)
+
+    def no_hard_links(src, dst):
+        raise OSError("hard links not supported")
+    monkeypatch.setattr(os, "link", no_hard_links)
+
+    used = _store(store, b"x" * 1000, "alice")
+    link = _session_link(storage, store, used, "alice")
+    assert os.stat(link).st_nlink == 1
+    # Referenced but not linked yet (between commit and link_into)
+    pending = _store(store, b"y" * 1000, "bob")
+    os.makedirs(storage / "sessions" / "bob")
+    # Referenced only by a session that no longer exists
+    orphaned = _store(store, b"z" * 1000, "carol")
+
+    entries = [path for _, path, user_id in reaper._eviction_candidates() if user_id is None]
+    assert store.entry_dir(orphaned) in entries
+    assert store.entry_dir(used) not in entries
+    assert store.entry_dir(pending) not in entries
+
+def test_reaper_evicts_entries_once_released(tmp_path):
+    storage = tmp_path / "storage"
+    store = BlobStore(str(storage / "cas"))
+    reaper = StorageReaper(str(storage), budget_bytes=0)
+    content_hash = _store(store, b"x" * 1000, "alice")
+    _session_link(storage, store, content_hash, "alice")
+    os.makedirs(os.path.join(store.extract_dir(content_hash), BlobStore.ROOT_NAME))
+
+    entries = [path for _, path, _ in reaper._eviction_candidates()]
+    assert os.path.join(store.entry_dir(content_hash), "source") in entries
+    assert store.entry_dir(content_hash) not in entries
+
+    store.release(content_hash, "alice")
+    assert store.entry_dir(content_hash) in [path for _, path, _ in reaper._eviction_candidates()]
+
+def _session(storage, user_id: str, nbytes: int, last_used: float):
+    session = storage / "sessions" / user_id
+    os.makedirs(session)
+    (session / "system_state.json").write_bytes(b"x" * nbytes)
+    os.utime(session / "system_state.json", (last_used, last_used))
+    return session
+
+def test_budget_evicts_least_recently_used_sessions_first(tmp_path):
+    storage = tmp_path / "storage"
+    reaper = StorageReaper(str(storage), budget_bytes=2500)
+    evicted = []
+    reaper.on_session_evicted = evicted.append
+    oldest = _session(storage, "oldest", 1000, 1000)
+    middle = _session(storage, "middle", 1000, 2000)
+    newest = _session(storage, "newest", 1000, 3000)
+
+    assert reaper.enforce_budget() == 1000
+    assert evicted == ["oldest"]
+    assert not oldest.exists() and middle.exists() and newest.exists()
+    assert reaper.usage() == 2000
+    assert reaper.enforce_budget() == 0
+
+def test_budget_skips_sessions_that_are_in_use(tmp_path):
+    storage = tmp_path / "storage"
+    reaper = StorageReaper(str(storage), budget_bytes=1500)
+    reaper.user_locks = UserLocks(lock_dir=str(tmp_path / "locks"))
+    busy = _session(storage, "busy", 1000, 1000)
+    idle = _session(storage, "idle", 1000, 2000)
+
+    with reaper.user_locks.hold_sync("busy"):
+        reaper.enforce_budget()
+    assert busy.exists() and not idle.exists()
+
+def test_usage_is_not_walked_every_interval(tmp_path, monkeypatch):
+    storage = tmp_path / "storage"
+    reaper = StorageReaper(str(storage), budget_bytes=5000, interval=0)
+    _session(storage, "alice", 1000, 1000)
+    walks = []
+    real_measure = reaper_module._measure
+    monkeypatch.setattr(reaper_module, "_measure", lambda root: walks.append(root) or real_measure(root))
+
+    for _ in range(3):
+        assert reaper.enforce_budget() == 0
+    assert len(walks) == 1
+
+    # An upload pushing the estimate over budget gets re-measured before anything is evicted
+    reaper.note_written(10_000)
+    assert reaper.enforce_budget() == 0
+    assert len(walks) == 2
+    assert (storage / "sessions" / "alice").exists()
@@ -0,0 +1,56 @@
+import time
+import asyncio
+import threading
+from app.user_locks import UserLocks
+
+def test_same_user_serialized_other_users_parallel(tmp_path):
+    events = []
+    locks = UserLocks(lock_dir=str(tmp_path), on_acquire=lambda u: events.append(("in", u)),
+                      on_release=lambda u: events.append(("out", u)))
+
+    async def work(user_id):
+        async with locks.hold(user_id):
+            await asyncio.sleep(0.1)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(work("a"), work("a"), work("b"))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(main())
+    # Two requests for "a" run back to back; "b" overlaps with them
+    assert elapsed >= 0.2
+    a_events = [kind for kind, user in events if user == "a"]
+    assert a_events == ["in", "out", "in", "out"]
+    assert events.index(("in", "b")) < events.index(("out", "a"))
+
+def test_background_thread_waits_for_request(tmp_path):
+    locks = UserLocks(lock_dir=str(tmp_path))
+    order = []
+
+    def job():
+        with locks.hold_sync("a"):
+            order.append("job")
+
+    async def request():
+        async with locks.hold("a"):
+            thread = threading.Thread(target=job)
+            thread.start()
+            await asyncio.sleep(0.1)
+            order.append("request")
+        return thread
+
+    asyncio.run(request()).join()
+    assert order == ["request", "job"]
+
+def test_release_hook_runs_off_the_event_loop(tmp_path):
+    threads = []
+    locks = UserLocks(lock_dir=str(tmp_path), on_release=lambda u: threads.append(threading.current_thread()))
+
+    async def request():
+        async with locks.hold("a"):
+            pass
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(request())
+    assert len(threads) == 1 and threads[0] is not loop_thread